@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -78,10 +79,35 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # File-backed test database so threaded and multi-process tests can
+        # share it; kept in the temp dir rather than the project root
+        'TEST': {
+            'NAME': Path(tempfile.gettempdir()) / 'seatswap_test_db.sqlite3',
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory needs no outside services. Switch to FileBasedCache or
+# DatabaseCache to share cached PNR data between worker processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'seatswap',
+    },
+    # Browse result sets must be seen by every process that changes listings
+    # (workers, cron commands), so never local memory; use redis or memcached
+    # in production
+    'browse': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'seatswap_browse_cache',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -122,3 +148,73 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# SeatSwap settings
+
+# Rows per page (overridable with ?page_size= up to the maximum)
+SEATSWAP_BROWSE_PAGE_SIZE = 20
+SEATSWAP_ADMIN_PAGE_SIZE = 50
+SEATSWAP_MAX_PAGE_SIZE = 100
+
+# PNR cache: per-process LRU in front of the CACHES tier
+SEATSWAP_PNR_LRU_SIZE = 1024
+SEATSWAP_PNR_LRU_TTL = 300
+SEATSWAP_PNR_CACHE_ALIAS = 'default'
+SEATSWAP_PNR_CACHE_TTL = 86400
+
+# PNR freshness windows in seconds, by journey state (see seats.pnr_cache.pnr_freshness)
+SEATSWAP_PNR_TTL = {
+    'past': 30 * 86400,
+    'charted': 12 * 3600,
+    'waitlisted': 15 * 60,
+    'near_departure': 30 * 60,
+    'confirmed': 6 * 3600,
+    'far_off': 3 * 86400,
+}
+SEATSWAP_PNR_NEAR_DEPARTURE_DAYS = 1
+SEATSWAP_PNR_FAR_OFF_DAYS = 7
+
+# Directory for the file locks that coalesce PNR fetches across worker
+# processes (None uses <tmp>/seatswap-locks). PNRs are hashed into a fixed
+# number of lock files so the directory never grows with traffic.
+SEATSWAP_PNR_LOCK_DIR = None
+SEATSWAP_PNR_LOCK_BUCKETS = 64
+
+# Seconds before the in-process station autocomplete index is rebuilt even if
+# no change was signalled through the cache
+SEATSWAP_STATION_INDEX_TTL = 3600
+
+# Seconds a station code the API could not resolve is not asked for again
+SEATSWAP_STATION_MISS_TTL = 6 * 3600
+
+# Seconds a stored train schedule is trusted before it is refetched from the
+# API, seconds a train the API could not answer for is not asked for again,
+# and schedules kept ready per process (see seats.schedules)
+SEATSWAP_SCHEDULE_TTL = 7 * 86400
+SEATSWAP_SCHEDULE_MISS_TTL = 3600
+SEATSWAP_SCHEDULE_LRU_SIZE = 256
+
+# Upper bounds in rupees of the price buckets offered as a browse facet; the
+# last bucket is open-ended (see seats.facets)
+SEATSWAP_PRICE_BUCKETS = [200, 500, 1000, 2000]
+
+# Seconds a booked seat is held for the buyer's payment before the sweeper
+# puts it back on sale, and how often each process sweeps on a background
+# thread (None leaves it to `manage.py release_expired_holds` from cron)
+SEATSWAP_HOLD_SECONDS = 15 * 60
+SEATSWAP_HOLD_SWEEP_INTERVAL = None
+
+# Days of past journeys kept in the hot tables, and where `manage.py
+# archive_past_journeys` writes the rows it moves out (None uses
+# <BASE_DIR>/archive); see seats.retention
+SEATSWAP_RETENTION_DAYS = 30
+SEATSWAP_ARCHIVE_DIR = None
+
+# Shared browse result sets, one per route, train and class (see
+# seats.browse_cache): the cache alias (shared by every process; a local
+# memory alias turns the cache off), seconds a set lives, and the largest
+# route that is cached
+SEATSWAP_BROWSE_CACHE_ALIAS = 'browse'
+SEATSWAP_BROWSE_CACHE_TTL = 300
+SEATSWAP_BROWSE_CACHE_MAX_ROWS = 2000
@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # seats comes first so its admin/exchanges/ console isn't swallowed by the admin catch-all
     path('', include('seats.urls')),
+    path('admin/', admin.site.urls),
 ]
@@ -3,8 +3,16 @@ Railway API utilities for fetching PNR status, station information, and train sc
 """
 
 import requests
+import asyncio
 import http.client
 import json
+import ssl
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
 from django.utils import timezone
 from datetime import datetime
 import logging
@@ -12,16 +20,385 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-class RapidAPIRailwayClient:
+class PoolTimeout(Exception):
+    """Raised when every connection slot for a host stays busy past the timeout"""
+
+
+class HTTPSConnectionPool:
+    """
+    Thread-safe pool of keep-alive HTTPS connections, bounded per host
+    
+    At most ``max_connections`` connections per host exist at once; further
+    callers block in ``acquire`` until one is returned. Idle connections are
+    reused newest-first and closed once they have been idle longer than
+    ``idle_timeout`` seconds or the host already has ``max_idle`` parked.
+    """
+    
+    def __init__(self, max_connections=8, max_idle=4, idle_timeout=60, timeout=10,
+                 connection_class=http.client.HTTPSConnection):
+        self.max_connections = max_connections
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.connection_class = connection_class
+        self._idle = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+    
+    def _slot(self, host):
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.max_connections)
+            return self._slots[host]
+    
+    def connect(self, host):
+        """Open a new connection honouring the pool's socket timeout"""
+        with self._lock:
+            self.created += 1
+        return self.connection_class(host, timeout=self.timeout)
+    
+    def acquire(self, host):
+        """
+        Get a connection to ``host``, waiting for a free slot if the host is at its cap
+        
+        Every acquired connection must be handed back with ``release`` or ``discard``.
+        
+        Returns:
+            tuple: (HTTPSConnection, True if it was reused from the pool)
+        """
+        if not self._slot(host).acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No free connection to {host} within {self.timeout}s")
+        
+        now = time.monotonic()
+        stale = []
+        conn = None
+        with self._lock:
+            idle = self._idle.setdefault(host, deque())
+            # Evict connections idle for too long (oldest sit at the left)
+            while idle and now - idle[0][1] > self.idle_timeout:
+                stale.append(idle.popleft()[0])
+            if idle:
+                conn = idle.pop()[0]
+                self.reused += 1
+        
+        for candidate in stale:
+            candidate.close()
+        
+        if conn is not None:
+            return conn, True
+        try:
+            return self.connect(host), False
+        except Exception:
+            self._slot(host).release()
+            raise
+    
+    def release(self, host, conn):
+        """Return a healthy connection to the pool (or close it if the pool is full)"""
+        with self._lock:
+            idle = self._idle.setdefault(host, deque())
+            parked = len(idle) < self.max_idle
+            if parked:
+                idle.append((conn, time.monotonic()))
+        if not parked:
+            conn.close()
+        self._slot(host).release()
+    
+    def discard(self, host, conn):
+        """Close a broken or server-closed connection and free its slot"""
+        conn.close()
+        self._slot(host).release()
+    
+    def close_all(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle_lists, self._idle = list(self._idle.values()), {}
+        for idle in idle_lists:
+            for conn, _ in idle:
+                conn.close()
+
+
+class AsyncConnectionPool:
+    """
+    asyncio counterpart of HTTPSConnectionPool, built on asyncio streams
+    
+    Connections are (reader, writer) pairs and belong to the event loop that
+    opened them, so slots and idle connections are tracked per running loop.
+    The per-host cap is much higher than the threaded pool's because a waiting
+    call costs a coroutine, not a worker thread.
+    
+    Keep-alive connections are only reused across requests under ASGI, where
+    every request runs on the server's one loop. Under WSGI each async view
+    runs on a fresh loop (asgiref's async_to_sync), so a connection serves the
+    calls of one request at most. Each loop gets a task that waits for the
+    loop's shutdown; asyncio.run and async_to_sync cancel pending tasks before
+    closing the loop, and the task then closes that loop's idle connections,
+    so they are not held until the loop is garbage collected.
+    """
+    
+    def __init__(self, max_connections=100, max_idle=20, idle_timeout=60, timeout=10, opener=None):
+        self.max_connections = max_connections
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.opener = opener or self._open_tls
+        self._loops = weakref.WeakKeyDictionary()
+        self._closers = weakref.WeakKeyDictionary()
+        self.created = 0
+        self.reused = 0
+    
+    @staticmethod
+    async def _open_tls(host):
+        return await asyncio.open_connection(host, 443, ssl=ssl.create_default_context())
+    
+    def _state(self, host):
+        loop = asyncio.get_running_loop()
+        if loop not in self._closers:
+            self._closers[loop] = loop.create_task(self._close_at_shutdown(loop))
+        hosts = self._loops.setdefault(loop, {})
+        if host not in hosts:
+            hosts[host] = (asyncio.Semaphore(self.max_connections), deque())
+        return hosts[host]
+    
+    async def connect(self, host):
+        """Open a new connection within the pool's timeout"""
+        self.created += 1
+        return await asyncio.wait_for(self.opener(host), self.timeout)
+    
+    async def acquire(self, host):
+        """
+        Get a connection to ``host``, waiting for a free slot if the host is at its cap
+        
+        Returns:
+            tuple: ((reader, writer), True if it was reused from the pool)
+        """
+        slots, idle = self._state(host)
+        try:
+            await asyncio.wait_for(slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"No free connection to {host} within {self.timeout}s")
+        
+        now = time.monotonic()
+        while idle and now - idle[0][1] > self.idle_timeout:
+            idle.popleft()[0][1].close()
+        if idle:
+            self.reused += 1
+            return idle.pop()[0], True
+        try:
+            return await self.connect(host), False
+        except BaseException:
+            slots.release()
+            raise
+    
+    def release(self, host, conn):
+        """Return a healthy connection to the pool (or close it if the pool is full)"""
+        slots, idle = self._state(host)
+        if len(idle) < self.max_idle:
+            idle.append((conn, time.monotonic()))
+        else:
+            conn[1].close()
+        slots.release()
+    
+    def discard(self, host, conn):
+        """Close a broken or server-closed connection and free its slot"""
+        conn[1].close()
+        self._state(host)[0].release()
+    
+    def close_all(self):
+        """Close every idle connection owned by the running loop"""
+        for _, idle in self._loops.pop(asyncio.get_running_loop(), {}).values():
+            for conn, _ in idle:
+                conn[1].close()
+    
+    async def _close_at_shutdown(self, loop):
+        """Wait until the loop cancels its pending tasks on the way out, then close its connections"""
+        try:
+            await loop.create_future()
+        finally:
+            self.close_all()
+            # The task refers to its loop, so drop it or the loop is never collected
+            self._closers.pop(loop, None)
+
+
+async def _read_http_response(reader):
+    """
+    Read one HTTP/1.1 response from an asyncio stream
+    
+    Returns:
+        tuple: (status, body bytes, True if the server will close the connection)
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise http.client.RemoteDisconnected("Remote end closed connection without response")
+    version, status = status_line.decode("latin-1").split(" ", 2)[:2]
+    
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    
+    will_close = version == "HTTP/1.0" or headers.get("connection", "").lower() == "close"
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                # Skip trailers up to the final blank line
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)
+        body = bytes(body)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        will_close = True
+    return int(status), body, will_close
+
+
+class BatchPNRMixin:
+    """``get_pnr_status_many`` for clients with a blocking ``get_pnr_status``"""
+    
+    def get_pnr_status_many(self, pnr_numbers, max_workers=8):
+        """
+        Fetch many PNRs over a thread pool, yielding each result as soon as it arrives
+        
+        At most ``max_workers`` lookups run at once and only that many more are
+        queued, so ``pnr_numbers`` can be a lazy iterable of any size.
+        Duplicate PNRs are fetched once.
+        
+        Args:
+            pnr_numbers (iterable): PNR numbers to fetch
+            max_workers (int): Upper bound on concurrent upstream calls
+            
+        Yields:
+            tuple: (pnr_number, PNR data or None), in completion order
+        """
+        pending_pnrs = _unique(pnr_numbers)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running = {}
+            
+            def submit(count):
+                for pnr_number in islice(pending_pnrs, count):
+                    running[executor.submit(self.get_pnr_status, pnr_number)] = pnr_number
+            
+            submit(max_workers * 2)
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield running.pop(future), future.result()
+                submit(len(done))
+
+
+class AsyncBatchPNRMixin:
+    """``get_pnr_status_many`` for clients whose ``get_pnr_status`` is a coroutine"""
+    
+    async def get_pnr_status_many(self, pnr_numbers, max_workers=32):
+        """
+        Fetch many PNRs concurrently on the running loop (see BatchPNRMixin)
+        
+        Yields:
+            tuple: (pnr_number, PNR data or None), in completion order
+        """
+        pending_pnrs = _unique(pnr_numbers)
+        running = {}
+        
+        def submit(count):
+            for pnr_number in islice(pending_pnrs, count):
+                running[asyncio.ensure_future(self.get_pnr_status(pnr_number))] = pnr_number
+        
+        try:
+            submit(max_workers)
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield running.pop(task), task.result()
+                submit(len(done))
+        finally:
+            for task in running:
+                task.cancel()
+
+
+def _unique(items):
+    seen = set()
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            yield item
+
+
+class RapidAPIRailwayClient(BatchPNRMixin):
     """
     Client for interacting with RapidAPI IRCTC APIs
+    
+    Safe to share between threads; requests reuse keep-alive connections
+    from ``self.pool``.
     """
     
-    def __init__(self, api_key=None):
+    # Errors that mean a pooled keep-alive socket was closed by the server
+    BROKEN_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                                http.client.CannotSendRequest, ConnectionError)
+    
+    def __init__(self, api_key=None, pool=None):
         self.api_key = api_key or "f77026abbamsh55be46e64f1caadp116470jsn76f82eff6a44"
         self.base_host = "irctc-indian-railway-pnr-status.p.rapidapi.com"
         self.timeout = 10
+        self.pool = pool or HTTPSConnectionPool(timeout=self.timeout)
+    
+    def _get_json(self, endpoint):
+        """
+        GET an endpoint over a pooled connection
+        
+        Args:
+            endpoint (str): Path and query string
+            
+        Returns:
+            tuple: (HTTP status, decoded JSON body or None)
+        """
+        headers = {
+            'x-rapidapi-key': self.api_key,
+            'x-rapidapi-host': self.base_host
+        }
+        
+        started = time.perf_counter()
+        conn, reused = self.pool.acquire(self.base_host)
+        try:
+            try:
+                conn.request("GET", endpoint, headers=headers)
+                res = conn.getresponse()
+            except self.BROKEN_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                # The server dropped the idle socket; retry once on a fresh connection
+                conn.close()
+                conn, reused = self.pool.connect(self.base_host), False
+                conn.request("GET", endpoint, headers=headers)
+                res = conn.getresponse()
+            data = res.read()
+        except Exception:
+            self.pool.discard(self.base_host, conn)
+            raise
+        
+        if res.will_close:
+            self.pool.discard(self.base_host, conn)
+        else:
+            self.pool.release(self.base_host, conn)
         
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.debug(f"GET {endpoint} -> {res.status} in {elapsed_ms:.1f} ms "
+                     f"({'reused' if reused else 'new'} connection)")
+        
+        try:
+            return res.status, json.loads(data.decode("utf-8"))
+        except ValueError:
+            return res.status, None
+    
     def get_pnr_status(self, pnr_number):
         """
         Get PNR status from RapidAPI IRCTC API
@@ -33,35 +410,7 @@ class RapidAPIRailwayClient:
             dict: PNR status data or None if error
         """
         try:
-            conn = http.client.HTTPSConnection(self.base_host)
-            
-            headers = {
-                'x-rapidapi-key': self.api_key,
-                'x-rapidapi-host': self.base_host
-            }
-            
-            endpoint = f"/getPNRStatus/{pnr_number}"
-            conn.request("GET", endpoint, headers=headers)
-            
-            res = conn.getresponse()
-            data = res.read()
-            
-            if res.status == 200:
-                api_data = json.loads(data.decode("utf-8"))
-                
-                # Check if response has success status
-                if api_data.get('success') == True or api_data.get('status') == True:
-                    return self._process_pnr_data(api_data)
-                else:
-                    logger.error(f"API error: {api_data.get('message', 'Unknown error')}")
-                    return None
-            elif res.status == 429:
-                logger.error("Rate limit exceeded - too many API requests")
-                return None
-            else:
-                logger.error(f"HTTP error: {res.status}")
-                return None
-                
+            return self._pnr_from_response(*self._get_json(self._pnr_endpoint(pnr_number)))
         except Exception as e:
             logger.error(f"Request error: {e}")
             return None
@@ -77,28 +426,9 @@ class RapidAPIRailwayClient:
             str: Station name or station code if not found
         """
         try:
-            conn = http.client.HTTPSConnection(self.base_host)
-            
-            headers = {
-                'x-rapidapi-key': self.api_key,
-                'x-rapidapi-host': self.base_host
-            }
-            
-            endpoint = f"/api/v3/getStationByCode?stationCode={station_code}"
-            conn.request("GET", endpoint, headers=headers)
-            
-            res = conn.getresponse()
-            data = res.read()
-            
-            if res.status == 200:
-                api_data = json.loads(data.decode("utf-8"))
-                
-                if api_data.get('status') == True:
-                    station_data = api_data.get('data', {})
-                    return station_data.get('name', station_code)
-                    
-            return station_code
-            
+            return self._station_name_from_response(
+                station_code, *self._get_json(self._station_endpoint(station_code))
+            )
         except Exception as e:
             logger.error(f"Error getting station name: {e}")
             return station_code
@@ -114,31 +444,69 @@ class RapidAPIRailwayClient:
             list: Train schedule data or empty list if error
         """
         try:
-            conn = http.client.HTTPSConnection(self.base_host)
-            
-            headers = {
-                'x-rapidapi-key': self.api_key,
-                'x-rapidapi-host': self.base_host
-            }
-            
-            endpoint = f"/api/v3/trainSchedule?trainNumber={train_number}"
-            conn.request("GET", endpoint, headers=headers)
-            
-            res = conn.getresponse()
-            data = res.read()
-            
-            if res.status == 200:
-                api_data = json.loads(data.decode("utf-8"))
-                
-                if api_data.get('status') == True:
-                    return api_data.get('data', [])
-                    
-            return []
-            
+            return self._schedule_from_response(*self._get_json(self._schedule_endpoint(train_number)))
         except Exception as e:
             logger.error(f"Error getting train schedule: {e}")
             return []
     
+    # Endpoints and response handling shared with AsyncRapidAPIRailwayClient
+    
+    @staticmethod
+    def _pnr_endpoint(pnr_number):
+        return f"/getPNRStatus/{pnr_number}"
+    
+    @staticmethod
+    def _station_endpoint(station_code):
+        return f"/api/v3/getStationByCode?stationCode={station_code}"
+    
+    @staticmethod
+    def _schedule_endpoint(train_number):
+        return f"/api/v3/trainSchedule?trainNumber={train_number}"
+    
+    def _pnr_from_response(self, status, api_data):
+        """Processed PNR data from a getPNRStatus response, or None"""
+        if status == 200 and api_data is not None:
+            # Check if response has success status
+            if api_data.get('success') == True or api_data.get('status') == True:
+                return self._process_pnr_data(api_data)
+            else:
+                logger.error(f"API error: {api_data.get('message', 'Unknown error')}")
+                return None
+        elif status == 429:
+            logger.error("Rate limit exceeded - too many API requests")
+            return None
+        else:
+            logger.error(f"HTTP error: {status}")
+            return None
+    
+    @staticmethod
+    def _station_name_from_response(station_code, status, api_data):
+        """Station name from a getStationByCode response, or the code itself"""
+        if status == 200 and api_data is not None:
+            if api_data.get('status') == True:
+                station_data = api_data.get('data', {})
+                return station_data.get('name', station_code)
+        return station_code
+    
+    @staticmethod
+    def _schedule_from_response(status, api_data):
+        """Stop list from a trainSchedule response, or an empty list"""
+        if status == 200 and api_data is not None:
+            if api_data.get('status') == True:
+                return api_data.get('data', [])
+        return []
+    
+    @staticmethod
+    def _is_chart_prepared(chart_status):
+        """
+        Whether the API's chartStatus says the chart is out
+        
+        Only an explicit "Chart Prepared" (including "Chart Prepared - Final")
+        counts; a missing or unrecognised status is treated as not prepared so
+        the PNR keeps being refreshed.
+        """
+        return (chart_status or '').strip().lower().startswith('chart prepared')
+    
     def _process_pnr_data(self, api_data):
         """
         Process raw PNR data from API response
@@ -217,7 +585,7 @@ class RapidAPIRailwayClient:
                 'destination_station_code': to_station_code,
                 'journey_date': journey_date,
                 'passenger_count': passenger_count,
-                'chart_prepared': data.get('chartStatus', '').lower() != 'chart not prepared',
+                'chart_prepared': self._is_chart_prepared(data.get('chartStatus')),
                 'travel_class': data.get('journeyClass', ''),
                 'booking_fare': str(booking_fare),
                 'quota': data.get('quota', ''),
@@ -236,13 +604,115 @@ class RapidAPIRailwayClient:
 
 
 # Mock API client for testing without actual API key
-class MockRailwayAPIClient:
+class AsyncRapidAPIRailwayClient(AsyncBatchPNRMixin, RapidAPIRailwayClient):
+    """
+    asyncio version of RapidAPIRailwayClient with the same methods as coroutines
+    
+    An upstream call awaits the network instead of holding a worker thread,
+    so one ASGI worker can keep thousands of PNR lookups in flight.
+    """
+    
+    BROKEN_CONNECTION_ERRORS = RapidAPIRailwayClient.BROKEN_CONNECTION_ERRORS + (asyncio.IncompleteReadError,)
+    
+    def __init__(self, api_key=None, pool=None):
+        super().__init__(api_key=api_key, pool=pool or AsyncConnectionPool(timeout=10))
+    
+    async def _request(self, conn, endpoint):
+        reader, writer = conn
+        writer.write((
+            f"GET {endpoint} HTTP/1.1\r\n"
+            f"Host: {self.base_host}\r\n"
+            f"x-rapidapi-key: {self.api_key}\r\n"
+            f"x-rapidapi-host: {self.base_host}\r\n"
+            f"Accept: application/json\r\n"
+            f"\r\n"
+        ).encode("latin-1"))
+        await writer.drain()
+        return await _read_http_response(reader)
+    
+    async def _get_json(self, endpoint):
+        """
+        GET an endpoint over a pooled connection
+        
+        Args:
+            endpoint (str): Path and query string
+            
+        Returns:
+            tuple: (HTTP status, decoded JSON body or None)
+        """
+        started = time.perf_counter()
+        conn, reused = await self.pool.acquire(self.base_host)
+        try:
+            try:
+                status, data, will_close = await asyncio.wait_for(self._request(conn, endpoint), self.timeout)
+            except self.BROKEN_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                # The server dropped the idle socket; retry once on a fresh connection
+                conn[1].close()
+                conn, reused = await self.pool.connect(self.base_host), False
+                status, data, will_close = await asyncio.wait_for(self._request(conn, endpoint), self.timeout)
+        except BaseException:
+            self.pool.discard(self.base_host, conn)
+            raise
+        
+        if will_close:
+            self.pool.discard(self.base_host, conn)
+        else:
+            self.pool.release(self.base_host, conn)
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.debug(f"GET {endpoint} -> {status} in {elapsed_ms:.1f} ms "
+                     f"({'reused' if reused else 'new'} connection)")
+        
+        try:
+            return status, json.loads(data.decode("utf-8"))
+        except ValueError:
+            return status, None
+    
+    async def get_pnr_status(self, pnr_number):
+        """Get PNR status from RapidAPI IRCTC API (see RapidAPIRailwayClient.get_pnr_status)"""
+        try:
+            return self._pnr_from_response(*await self._get_json(self._pnr_endpoint(pnr_number)))
+        except Exception as e:
+            logger.error(f"Request error: {e}")
+            return None
+    
+    async def get_station_name(self, station_code):
+        """Get station name from station code (see RapidAPIRailwayClient.get_station_name)"""
+        try:
+            return self._station_name_from_response(
+                station_code, *await self._get_json(self._station_endpoint(station_code))
+            )
+        except Exception as e:
+            logger.error(f"Error getting station name: {e}")
+            return station_code
+    
+    async def get_train_schedule(self, train_number):
+        """Get train schedule (see RapidAPIRailwayClient.get_train_schedule)"""
+        try:
+            return self._schedule_from_response(*await self._get_json(self._schedule_endpoint(train_number)))
+        except Exception as e:
+            logger.error(f"Error getting train schedule: {e}")
+            return []
+
+
+class MockRailwayAPIClient(BatchPNRMixin):
     """
     Mock client for testing purposes
     """
     
+    def __init__(self, latency=0):
+        # Simulated upstream response time in seconds
+        self.latency = latency
+    
     def get_pnr_status(self, pnr_number):
         """Mock PNR status data"""
+        if self.latency:
+            time.sleep(self.latency)
+        return self._mock_pnr_data(pnr_number)
+    
+    def _mock_pnr_data(self, pnr_number):
         # Different mock data based on PNR number for testing
         mock_data_sets = {
             '8634824688': {
@@ -485,14 +955,65 @@ class MockRailwayAPIClient:
         ]
 
 
+class AsyncMockRailwayAPIClient(AsyncBatchPNRMixin, MockRailwayAPIClient):
+    """
+    Mock client with the coroutine interface of AsyncRapidAPIRailwayClient
+    """
+    
+    async def get_pnr_status(self, pnr_number):
+        """Mock PNR status data"""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._mock_pnr_data(pnr_number)
+    
+    async def get_station_name(self, station_code):
+        """Mock station name data"""
+        return MockRailwayAPIClient.get_station_name(self, station_code)
+    
+    async def get_train_schedule(self, train_number):
+        """Mock train schedule data"""
+        return MockRailwayAPIClient.get_train_schedule(self, train_number)
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
 def get_railway_api_client():
     """
     Get the appropriate Railway API client based on configuration
     
+    The client is created once per process and shared, so its connection
+    pool is reused across requests.
+    
     Returns:
         IRailwayClient: API client instance
     """
-    # Use real API by default
-    # Comment out the line below and uncomment the mock line if you want to use mock data for testing
-    return RapidAPIRailwayClient()
-    # return MockRailwayAPIClient()
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                # Use real API by default
+                # Comment out the line below and uncomment the mock line if you want to use mock data for testing
+                _shared_client = RapidAPIRailwayClient()
+                # _shared_client = MockRailwayAPIClient()
+    return _shared_client
+
+
+_shared_async_client = None
+
+
+def get_async_railway_api_client():
+    """
+    Get the shared asyncio Railway API client, the async twin of get_railway_api_client
+    
+    Returns:
+        AsyncRapidAPIRailwayClient: API client instance
+    """
+    global _shared_async_client
+    if _shared_async_client is None:
+        with _shared_client_lock:
+            if _shared_async_client is None:
+                # Swap for AsyncMockRailwayAPIClient() to use mock data, as above
+                _shared_async_client = AsyncRapidAPIRailwayClient()
+    return _shared_async_client
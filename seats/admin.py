@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import UserProfile, SeatListing, SeatExchange, PNRStatus, StationCode
+from .models import (
+    UserProfile, SeatListing, SeatExchange, SeatRequest, PNRStatus, StationCode, SwapGroup, SwapMove, Train, TrainStop,
+)
 
 
 @admin.register(UserProfile)
@@ -13,14 +15,37 @@ class UserProfileAdmin(admin.ModelAdmin):
 class SeatListingAdmin(admin.ModelAdmin):
     list_display = ['owner', 'pnr_number', 'train_name', 'source_station', 'destination_station', 
                    'seat_type', 'seat_number', 'price', 'status', 'created_at']
-    list_filter = ['status', 'seat_type', 'journey_date', 'created_at']
+    list_filter = ['status', 'seat_type', 'travel_class', 'journey_date', 'created_at']
     search_fields = ['pnr_number', 'train_name', 'source_station', 'destination_station', 'owner__username']
     readonly_fields = ['created_at', 'updated_at']
 
 
+@admin.register(SeatRequest)
+class SeatRequestAdmin(admin.ModelAdmin):
+    list_display = ['requester', 'train_number', 'journey_date', 'travel_class', 'seat_type', 'coach_prefix',
+                    'max_price', 'status', 'created_at']
+    list_filter = ['status', 'seat_type', 'travel_class', 'journey_date']
+    search_fields = ['requester__username', 'train_number']
+    readonly_fields = ['created_at']
+
+
+class SwapMoveInline(admin.TabularInline):
+    model = SwapMove
+    extra = 0
+    raw_id_fields = ['traveller', 'seat_request', 'gives', 'receives']
+
+
+@admin.register(SwapGroup)
+class SwapGroupAdmin(admin.ModelAdmin):
+    list_display = ['id', 'train_number', 'journey_date', 'status', 'created_at']
+    list_filter = ['status', 'journey_date']
+    search_fields = ['train_number']
+    inlines = [SwapMoveInline]
+
+
 @admin.register(SeatExchange)
 class SeatExchangeAdmin(admin.ModelAdmin):
-    list_display = ['seat_listing', 'buyer', 'seller', 'exchange_amount', 'payment_status', 'exchange_date']
+    list_display = ['seat_listing', 'buyer', 'seller', 'exchange_amount', 'payment_status', 'hold_expires_at', 'exchange_date']
     list_filter = ['payment_status', 'exchange_date']
     search_fields = ['buyer__username', 'seller__username', 'seat_listing__train_name', 'payment_transaction_id']
     readonly_fields = ['exchange_date', 'completion_date']
@@ -28,8 +53,9 @@ class SeatExchangeAdmin(admin.ModelAdmin):
 
 @admin.register(PNRStatus)
 class PNRStatusAdmin(admin.ModelAdmin):
-    list_display = ['pnr_number', 'train_name', 'source_station', 'destination_station', 'journey_date', 'last_updated']
-    list_filter = ['journey_date', 'last_updated']
+    list_display = ['pnr_number', 'train_name', 'source_station', 'destination_station', 'journey_date',
+                    'chart_prepared', 'last_updated']
+    list_filter = ['chart_prepared', 'journey_date', 'last_updated']
     search_fields = ['pnr_number', 'train_name', 'source_station', 'destination_station']
     readonly_fields = ['last_updated']
 
@@ -39,3 +65,16 @@ class StationCodeAdmin(admin.ModelAdmin):
     list_display = ['station_code', 'station_name', 'state']
     list_filter = ['state']
     search_fields = ['station_code', 'station_name', 'state']
+
+
+class TrainStopInline(admin.TabularInline):
+    model = TrainStop
+    extra = 0
+
+
+@admin.register(Train)
+class TrainAdmin(admin.ModelAdmin):
+    list_display = ['train_number', 'train_name', 'fetched_at']
+    search_fields = ['train_number', 'train_name']
+    readonly_fields = ['fetched_at']
+    inlines = [TrainStopInline]
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class SeatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'seats'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the receivers)
+
+        from django.conf import settings
+        interval = getattr(settings, 'SEATSWAP_HOLD_SWEEP_INTERVAL', None)
+        if interval:
+            from .holds import start_hold_sweeper
+            start_hold_sweeper(interval)
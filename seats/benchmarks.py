@@ -0,0 +1,634 @@
+"""
+Benchmarks for SeatSwap hot paths.
+
+Run with ``python manage.py benchmark <name>``. Every benchmark seeds the rows
+it needs inside a transaction that is rolled back afterwards, so it is safe to
+point at a development database.
+"""
+
+import asyncio
+import csv
+import http.client
+import http.server
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from railway_api import AsyncConnectionPool, AsyncRapidAPIRailwayClient, HTTPSConnectionPool, RapidAPIRailwayClient
+from .browse_cache import browse_cache
+from .facets import facet_counts, facet_counts_from_rows
+from .models import (
+    PassengerDetails, PNRStatus, SeatListing, SeatMatch, SeatRequest, StationCode, UserProfile, route_key,
+)
+from .pagination import keyset_paginate, keyset_paginate_rows
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register a benchmark function under ``name``"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back"""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def time_call(func, repeat):
+    """Return (best, mean) wall time of ``func`` in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings), sum(timings) / len(timings)
+
+
+def _seed_listings(owner, size, station_count=400, days=90, batch_size=5000, rng=None):
+    """Bulk insert ``size`` random listings and return the busiest (src, dst, date)"""
+    rng = rng or random.Random(42)
+    codes = [f'S{i:03d}' for i in range(station_count)]
+    today = timezone.now().date()
+    statuses = ['AVAILABLE'] * 6 + ['BOOKED', 'COMPLETED', 'CANCELLED']
+    seat_types = [choice for choice, _ in SeatListing.SEAT_TYPES]
+
+    # One listing in a thousand lands on the same hot route, like a busy train
+    hot_route = (codes[0], codes[1], today + timedelta(days=1))
+
+    for start in range(0, size, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, size)):
+            if i % 1000 == 0:
+                source, destination, journey_date = hot_route
+            else:
+                source, destination = rng.sample(codes, 2)
+                journey_date = today + timedelta(days=rng.randrange(days))
+            batch.append(SeatListing(
+                owner=owner,
+                pnr_number=f'{i:010d}',
+                train_number=str(12000 + rng.randrange(500)),
+                train_name='BENCH EXP',
+                source_station=f'Station {source}',
+                destination_station=f'Station {destination}',
+                source_station_code=source,
+                destination_station_code=destination,
+                journey_date=journey_date,
+                route_key=route_key(source, destination, journey_date),
+                seat_type=rng.choice(seat_types),
+                seat_number=str(rng.randrange(1, 73)),
+                coach_number=f'S{rng.randrange(1, 12)}',
+                price=Decimal(rng.randrange(50, 2000)),
+                status=rng.choice(statuses),
+            ))
+        SeatListing.objects.bulk_create(batch, batch_size=batch_size)
+    return hot_route
+
+
+@benchmark('browse')
+def bench_browse(out, size=1_000_000, repeat=5):
+    """Route lookup in browse_seats: icontains OR-chains vs the route_key on the route index"""
+    with rolled_back():
+        owner = User.objects.create(username='bench-owner')
+        buyer = User.objects.create(username='bench-buyer')
+
+        started = time.perf_counter()
+        source, destination, journey_date = _seed_listings(owner, size)
+        out(f'Seeded {size} listings in {time.perf_counter() - started:.1f}s')
+
+        def before():
+            return list(SeatListing.objects.filter(status='AVAILABLE').exclude(owner=buyer).filter(
+                Q(source_station__icontains=source) | Q(source_station_code__icontains=source),
+                Q(destination_station__icontains=destination) | Q(destination_station_code__icontains=destination),
+                journey_date=journey_date,
+            ))
+
+        def after():
+            return list(SeatListing.objects.filter(
+                status='AVAILABLE',
+                route_key=route_key(source, destination, journey_date),
+            ).exclude(owner=buyer))
+
+        rows_before, rows_after = len(before()), len(after())
+        best_before, mean_before = time_call(before, repeat)
+        best_after, mean_after = time_call(after, repeat)
+
+        out(f'before (icontains): {rows_before} rows, best {best_before:.1f} ms, mean {mean_before:.1f} ms')
+        out(f'after  (route key): {rows_after} rows, best {best_after:.1f} ms, mean {mean_after:.1f} ms')
+        out(f'speedup: {mean_before / mean_after:.1f}x')
+        out('plan after: ' + SeatListing.objects.filter(
+            status='AVAILABLE',
+            route_key=route_key(source, destination, journey_date),
+        ).explain())
+
+
+class _KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    """Answers every GET with a small station JSON over HTTP/1.1 keep-alive"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    handshake_delay = 0.03
+
+    def setup(self):
+        # Charge a TCP+TLS handshake's worth of round trips once per connection
+        time.sleep(self.handshake_delay)
+        super().setup()
+
+    def do_GET(self):
+        body = json.dumps({'status': True, 'data': {'name': 'New Delhi'}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@benchmark('api_client')
+def bench_api_client(out, size=50, repeat=3):
+    """Per-call time of RapidAPIRailwayClient: new connection per call vs the keep-alive pool"""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+    server.daemon_threads = True
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    out(f'Local server with {_KeepAliveHandler.handshake_delay * 1000:.0f} ms simulated handshake per connection')
+
+    def local_connection(host, timeout=None):
+        return http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+
+    try:
+        results = {}
+        # max_idle=0 never parks a connection, which is what the old code did
+        for label, max_idle in (('fresh connection', 0), ('pooled keep-alive', 4)):
+            pool = HTTPSConnectionPool(max_idle=max_idle, connection_class=local_connection)
+            client = RapidAPIRailwayClient(api_key='bench', pool=pool)
+
+            def calls():
+                for _ in range(size):
+                    client.get_station_name('NDLS')
+
+            best, mean = time_call(calls, repeat)
+            results[label] = mean / size
+            out(f'{label}: {mean / size:.2f} ms per call (best run {best / size:.2f} ms), '
+                f'{pool.created} connections opened')
+            pool.close_all()
+
+        out(f'saving per call: {results["fresh connection"] - results["pooled keep-alive"]:.2f} ms')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class _SlowPNRHandler(_KeepAliveHandler):
+    """Answers PNR lookups after a fixed upstream delay and tracks peak concurrency"""
+
+    handshake_delay = 0
+    upstream_delay = 0.2
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak = max(cls.peak, cls.in_flight)
+        try:
+            time.sleep(self.upstream_delay)
+            body = json.dumps({'status': True, 'data': {'trainNumber': '12185', 'passengerList': []}}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+
+class _BusyServer(http.server.ThreadingHTTPServer):
+    """Local server with a listen backlog deep enough for a burst of connections"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+@benchmark('async_pnr')
+def bench_async_pnr(out, size=500, repeat=1, workers=8):
+    """PNR lookups in one worker: 8-thread sync client vs one event loop with the asyncio client"""
+    server = _BusyServer(('127.0.0.1', 0), _SlowPNRHandler)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    out(f'{size} lookups against a local server answering after {_SlowPNRHandler.upstream_delay * 1000:.0f} ms')
+
+    pnrs = [f'{number:010d}' for number in range(size)]
+
+    def sync_run():
+        pool = HTTPSConnectionPool(max_connections=workers, connection_class=lambda host, timeout=None:
+                                   http.client.HTTPConnection('127.0.0.1', port, timeout=timeout))
+        client = RapidAPIRailwayClient(api_key='bench', pool=pool)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(client.get_pnr_status, pnrs))
+        pool.close_all()
+        return results
+
+    async def lookups():
+        pool = AsyncConnectionPool(max_connections=size, max_idle=size,
+                                   opener=lambda host: asyncio.open_connection('127.0.0.1', port))
+        client = AsyncRapidAPIRailwayClient(api_key='bench', pool=pool)
+        results = await asyncio.gather(*[client.get_pnr_status(pnr) for pnr in pnrs])
+        pool.close_all()
+        return results
+
+    try:
+        for label, run in ((f'sync, {workers} threads', sync_run), ('async, 1 event loop', lambda: asyncio.run(lookups()))):
+            _SlowPNRHandler.peak = 0
+            ok = sum(1 for result in run() if result)
+            best, mean = time_call(run, repeat)
+            out(f'{label}: {ok}/{size} ok, {mean / 1000:.2f} s, {size / (mean / 1000):.0f} lookups/s, '
+                f'peak {_SlowPNRHandler.peak} upstream calls in flight')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class _StatementCounter:
+    """Database execute wrapper counting statements by their leading keyword"""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.counts[sql.lstrip().split(' ', 1)[0].upper()] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def writes(self):
+        return self.counts['INSERT'] + self.counts['UPDATE'] + self.counts['DELETE']
+
+
+def _replace_passengers(pnr_number, pnr_data):
+    """The pre-diff refresh: upsert the PNR, then delete and re-insert every passenger"""
+    from .views import passenger_details, pnr_status_fields
+    pnr_status, _ = PNRStatus.objects.update_or_create(pnr_number=pnr_number, defaults=pnr_status_fields(pnr_data))
+    pnr_status.passengers.all().delete()
+    for passenger_info in pnr_data.get('passengers', []):
+        passenger_details(pnr_status, passenger_info).save()
+
+
+@benchmark('pnr_refresh')
+def bench_pnr_refresh(out, size=500, repeat=3):
+    """Writes per refresh cycle when nothing changed: delete-and-reinsert vs diffed passengers"""
+    from .views import store_pnr_status, store_pnr_statuses
+
+    def pnr_data(number):
+        return {
+            'train_number': '12185', 'train_name': 'BENCH EXP', 'journey_date': timezone.now().date(),
+            'source_station_code': 'S000', 'destination_station_code': 'S001', 'passenger_count': 6,
+            'passengers': [
+                {'passenger_serial_number': serial, 'booking_status': 'CNF', 'booking_coach_id': 'B6',
+                 'booking_berth_no': str(number % 64 + serial), 'booking_berth_code': 'LB',
+                 'current_status': 'CNF', 'current_coach_id': 'B6',
+                 'current_berth_no': str(number % 64 + serial), 'current_berth_code': 'LB'}
+                for serial in range(1, 7)
+            ],
+        }
+
+    items = [(f'{number:010d}', pnr_data(number)) for number in range(size)]
+    strategies = [
+        ('delete + re-insert', lambda: [_replace_passengers(pnr, data) for pnr, data in items]),
+        ('diff, per PNR', lambda: [store_pnr_status(pnr, data) for pnr, data in items]),
+        ('diff, batches of 100', lambda: [store_pnr_statuses(items[start:start + 100])
+                                          for start in range(0, size, 100)]),
+    ]
+    out(f'{size} PNRs x 6 passengers, {repeat} refresh cycles with unchanged data')
+    for label, refresh in strategies:
+        with rolled_back():
+            store_pnr_statuses(items)
+            counter = _StatementCounter()
+            with connection.execute_wrapper(counter):
+                best, mean = time_call(refresh, repeat)
+            passenger_rows = PassengerDetails.objects.count()
+        out(f'{label}: {counter.writes / repeat:.0f} writes per cycle ({counter.writes / repeat / size:.1f} per PNR), '
+            f'{sum(counter.counts.values()) / repeat:.0f} statements, mean {mean:.0f} ms, '
+            f'{passenger_rows} passenger rows')
+
+
+@benchmark('load_stations')
+def bench_load_stations(out, size=9000, repeat=1):
+    """Loading a national station dataset: get_or_create per row vs the chunked bulk upsert"""
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['station_code', 'station_name', 'state'])
+        rows = [(f'B{number:05d}', f'Bench Station {number}', 'Bench') for number in range(size)]
+        writer.writerows(rows)
+    out(f'{size} stations')
+
+    def get_or_create_loop():
+        for code, name, state in rows:
+            StationCode.objects.get_or_create(station_code=code, defaults={'station_name': name, 'state': state})
+
+    def bulk_load():
+        call_command('load_stations', handle.name, stdout=io.StringIO())
+
+    try:
+        for label, load in (('get_or_create loop', get_or_create_loop), ('bulk upsert', bulk_load)):
+            with rolled_back():
+                best_first, _ = time_call(load, 1)
+                best_reload, _ = time_call(load, repeat)
+            out(f'{label}: first load {best_first:.0f} ms, reload {best_reload:.0f} ms')
+    finally:
+        os.unlink(handle.name)
+
+
+@benchmark('station_search')
+def bench_station_search(out, size=9000, repeat=2000):
+    """Autocomplete: SQL icontains over StationCode vs the in-process prefix index"""
+    from .stations import StationIndex
+
+    rng = random.Random(7)
+    words = ['Junction', 'Central', 'Road', 'City', 'Cantt', 'Halt', 'Nagar', 'Pur', 'Ganj', 'Bad']
+    with rolled_back():
+        StationCode.objects.bulk_create([
+            StationCode(station_code=f'{chr(65 + number % 26)}{number:04d}',
+                        station_name=f'{rng.choice(words)}{number} {rng.choice(words)}')
+            for number in range(size)
+        ])
+        queries = ['jun', 'cent', 'a12', 'road', 'nagar3', 'c0', 'halt', 'pur1']
+
+        def sql():
+            for query in queries:
+                list(StationCode.objects.filter(
+                    Q(station_code__istartswith=query) | Q(station_name__icontains=query)
+                ).values_list('station_code', 'station_name', 'state')[:10])
+
+        started = time.perf_counter()
+        index = StationIndex(StationCode.objects.values_list('station_code', 'station_name', 'state'))
+        out(f'Built index over {len(index)} stations in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+        def indexed():
+            for query in queries:
+                index.search(query, 10)
+
+        sql_best, sql_mean = time_call(sql, max(1, repeat // 100))
+        index_best, index_mean = time_call(indexed, repeat)
+        out(f'SQL icontains: {sql_mean / len(queries) * 1000:.0f} us per query')
+        out(f'prefix index: {index_mean / len(queries) * 1000:.1f} us per query')
+
+
+def _scan_all_requests(listings):
+    """The naive matcher: read every open request and test each listing against it"""
+    from .matching import _satisfies
+    matches = 0
+    for seat_request in SeatRequest.objects.filter(status='OPEN').iterator(chunk_size=5000):
+        for listing in listings:
+            if (seat_request.train_number == listing.train_number
+                    and seat_request.journey_date == listing.journey_date
+                    and seat_request.travel_class in ('', listing.travel_class)
+                    and seat_request.seat_type in ('', listing.seat_type)
+                    and _satisfies(seat_request, listing)):
+                matches += 1
+    return matches
+
+
+@benchmark('seat_matching')
+def bench_seat_matching(out, size=1_000_000, repeat=3):
+    """Matching 1000 new listings as open seat requests grow: bucket probes vs scanning every request"""
+    from .matching import match_listings
+
+    rng = random.Random(11)
+    trains = [str(12000 + number) for number in range(500)]
+    classes = ['SL', '3A', '2A', '1A']
+    seat_types = [choice for choice, _ in SeatListing.SEAT_TYPES]
+    today = timezone.now().date()
+
+    def journey():
+        return rng.choice(trains), today + timedelta(days=rng.randrange(60))
+
+    with rolled_back():
+        buyer = User.objects.create(username='bench-buyer')
+        seller = User.objects.create(username='bench-seller')
+        SeatListing.objects.bulk_create([
+            SeatListing(owner=seller, pnr_number=f'{number:010d}', train_name='BENCH EXP',
+                        source_station='Station S000', destination_station='Station S001',
+                        source_station_code='S000', destination_station_code='S001',
+                        travel_class=rng.choice(classes), seat_type=rng.choice(seat_types),
+                        seat_number=str(rng.randrange(1, 73)), coach_number=f'B{rng.randrange(1, 10)}',
+                        price=Decimal(rng.randrange(50, 2000)),
+                        **dict(zip(('train_number', 'journey_date'), journey())))
+            for number in range(1000)
+        ])
+        listings = list(SeatListing.objects.filter(owner=seller))
+
+        seeded = 0
+        for target in sorted({max(size // 100, 1), max(size // 10, 1), size}):
+            started = time.perf_counter()
+            while seeded < target:
+                batch = []
+                for _ in range(min(5000, target - seeded)):
+                    train_number, journey_date = journey()
+                    batch.append(SeatRequest(
+                        requester=buyer, train_number=train_number, journey_date=journey_date,
+                        # Roughly a third of buyers leave class or berth open
+                        travel_class=rng.choice(classes + ['']), seat_type=rng.choice(seat_types + ['']),
+                        coach_prefix=rng.choice(['', '', 'B', 'A']),
+                        max_price=rng.choice([None, Decimal(rng.randrange(100, 2500))]),
+                    ))
+                SeatRequest.objects.bulk_create(batch)
+                seeded += len(batch)
+            out(f'{seeded} open requests (seeded in {time.perf_counter() - started:.1f}s)')
+
+            def probe():
+                with rolled_back():
+                    match_listings(listings)
+
+            best, mean = time_call(probe, repeat)
+            with rolled_back():
+                match_listings(listings)
+                matches = SeatMatch.objects.count()
+            out(f'  bucket probes: {matches} matches for {len(listings)} listings, mean {mean:.0f} ms '
+                f'({len(listings) / mean * 1000:.0f} listings/s)')
+
+        sample = listings[:10]
+        started = time.perf_counter()
+        _scan_all_requests(sample)
+        elapsed = time.perf_counter() - started
+        out(f'full scan of {seeded} requests: {elapsed * 1000 / len(sample):.0f} ms per listing '
+            f'({len(sample) / elapsed:.1f} listings/s)')
+
+
+@benchmark('swap_cycles')
+def bench_swap_cycles(out, size=22, repeat=5):
+    """Swap cycle proposals on a charted train of ``size`` 72-berth coaches, every traveller asking to move"""
+    from .swaps import BERTH_SEAT_TYPES, build_swap_graph, find_swap_cycles, load_travellers, propose_swaps
+
+    rng = random.Random(5)
+    bay = ['LB', 'MB', 'UB', 'LB', 'MB', 'UB', 'SL', 'SU']
+    seat_types = sorted(set(BERTH_SEAT_TYPES.values()))
+    journey_date = timezone.now().date() + timedelta(days=1)
+    coaches = [f'B{number + 1}' if number < size // 2 else f'S{number - size // 2 + 1}' for number in range(size)]
+    berths = [(coach, berth_no) for coach in coaches for berth_no in range(1, 73)]
+
+    with rolled_back():
+        users = User.objects.bulk_create([User(username=f'bench-traveller-{number}') for number in range(len(berths))])
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, phone_number='0', current_pnr=f'{number:010d}', journey_date=journey_date)
+            for number, user in enumerate(users)
+        ])
+        statuses = PNRStatus.objects.bulk_create([
+            PNRStatus(pnr_number=f'{number:010d}', train_number='12185', train_name='BENCH EXP',
+                      source_station='S000', destination_station='S001', source_station_code='S000',
+                      destination_station_code='S001', journey_date=journey_date, passenger_count=1,
+                      travel_class='3A', chart_prepared=True)
+            for number in range(len(berths))
+        ])
+        PassengerDetails.objects.bulk_create([
+            PassengerDetails(pnr_status=pnr_status, passenger_serial_number=1, booking_status='CNF',
+                             booking_coach_id=coach, booking_berth_no=berth_no,
+                             booking_berth_code=bay[(berth_no - 1) % 8], current_status='CNF',
+                             current_coach_id=coach, current_berth_no=berth_no,
+                             current_berth_code=bay[(berth_no - 1) % 8])
+            for pnr_status, (coach, berth_no) in zip(statuses, berths)
+        ])
+        SeatRequest.objects.bulk_create([
+            SeatRequest(requester=user, train_number='12185', journey_date=journey_date,
+                        seat_type=rng.choice(seat_types + ['']), coach_prefix=rng.choice(['', '', 'B', 'S', 'B1']))
+            for user in users
+        ])
+        out(f'{len(berths)} travellers in {size} coaches')
+
+        travellers = load_travellers('12185', journey_date)
+        graph = build_swap_graph(travellers)
+        out(f'{len(graph)} want to move, {sum(len(successors) for successors in graph.values())} edges')
+        for max_length in (2, 3, 4):
+            cycles = find_swap_cycles(graph, max_length)
+            _, mean = time_call(lambda: find_swap_cycles(graph, max_length), repeat)
+            out(f'  cycles up to {max_length}: {len(cycles)} groups, {sum(len(cycle) for cycle in cycles)} '
+                f'travellers, search {mean:.0f} ms')
+
+        _, load_mean = time_call(lambda: load_travellers('12185', journey_date), repeat)
+        _, graph_mean = time_call(lambda: build_swap_graph(travellers), repeat)
+        _, total_mean = time_call(lambda: propose_swaps('12185', journey_date), repeat)
+        out(f'propose_swaps end to end: {total_mean:.0f} ms (load {load_mean:.0f} ms, graph {graph_mean:.0f} ms)')
+
+
+@benchmark('nearest_seats')
+def bench_nearest_seats(out, size=5000, repeat=20):
+    """Nearest-berth ranking of ``size`` listings: sorting them all vs keeping the top 20 on a heap"""
+    from types import SimpleNamespace
+
+    from .layouts import nearest, proximity
+
+    rng = random.Random(9)
+    listings = [
+        SimpleNamespace(travel_class='SL', coach_number=f'S{rng.randrange(1, 13)}', seat_number=str(rng.randrange(1, 73)))
+        for _ in range(size)
+    ]
+
+    def sort_all():
+        return sorted(listings, key=lambda listing: proximity(
+            'SL', 'S5', 33, listing.coach_number, listing.seat_number))[:20]
+
+    def heap_top():
+        return nearest(listings, 'SL', 'S5', 33, 20)
+
+    assert [id(listing) for listing in sort_all()] == [id(listing) for listing in heap_top()]
+    _, sort_mean = time_call(sort_all, repeat)
+    _, heap_mean = time_call(heap_top, repeat)
+    out(f'{size} listings, top 20: full sort {sort_mean:.1f} ms, heap {heap_mean:.1f} ms')
+
+
+@benchmark('route_key')
+def bench_route_key(out, size=1_000_000, repeat=20):
+    """A route's newest page: three columns compared pairwise vs one route_key equality"""
+    with rolled_back():
+        owner = User.objects.create(username='bench-owner')
+        buyer = User.objects.create(username='bench-buyer')
+
+        started = time.perf_counter()
+        source, destination, journey_date = _seed_listings(owner, size)
+        out(f'Seeded {size} listings in {time.perf_counter() - started:.1f}s')
+
+        pairwise = SeatListing.objects.filter(
+            status='AVAILABLE', source_station_code=source, destination_station_code=destination,
+            journey_date=journey_date,
+        ).exclude(owner=buyer).order_by('-created_at', '-id')
+        keyed = SeatListing.objects.filter(
+            status='AVAILABLE', route_key=route_key(source, destination, journey_date),
+        ).exclude(owner=buyer).order_by('-created_at', '-id')
+
+        for label, query in (('pairwise codes', pairwise), ('route_key', keyed)):
+            rows = len(list(query[:20]))
+            best, mean = time_call(lambda: list(query[:20]), repeat)
+            out(f'{label}: {rows} rows, best {best:.2f} ms, mean {mean:.2f} ms')
+            out(f'  plan: {query.explain()}')
+
+
+@benchmark('browse_cache')
+def bench_browse_cache(out, size=1_000_000, repeat=20):
+    """A busy route's first browse page with facets: database queries vs cached route rows"""
+    with rolled_back():
+        owner = User.objects.create(username='bench-owner')
+        buyer = User.objects.create(username='bench-buyer')
+
+        started = time.perf_counter()
+        route = route_key(*_seed_listings(owner, size))
+        out(f'Seeded {size} listings in {time.perf_counter() - started:.1f}s')
+        seats = SeatListing.objects.filter(status='AVAILABLE', route_key=route)
+
+        def database():
+            listings = seats.exclude(owner=buyer)
+            facet_counts(listings, {})
+            return list(keyset_paginate(listings.select_related('owner'), None, 20))
+
+        def cached():
+            rows = [row for row in browse_cache.rows(route, seats) if row.owner_id != buyer.id]
+            facet_counts_from_rows(rows, {})
+            page = keyset_paginate_rows(rows, SeatListing, None, 20)
+            listings = seats.select_related('owner').order_by().in_bulk([row.id for row in page])
+            return [listings[row.id] for row in page]
+
+        try:
+            browse_cache.bump([route])
+            started = time.perf_counter()
+            rows = len(cached())
+            out(f'cache miss: {rows} rows, {(time.perf_counter() - started) * 1000:.2f} ms')
+            browse_cache.clear()
+            for label, func in (('database', database), ('cache hit', cached)):
+                best, mean = time_call(func, repeat)
+                out(f'{label}: best {best:.2f} ms, mean {mean:.2f} ms')
+            out(f"hit ratio: {browse_cache.stats()['hit_ratio']}")
+        finally:
+            # The seeded rows are rolled back, so drop what was cached from them
+            browse_cache.bump([route])
@@ -0,0 +1,162 @@
+"""
+Shared cache of browse_seats result sets, invalidated per route.
+
+Everyone on a train browses the same few routes, so the rows behind a route
+page are cached once for all of them: for each (route key, train, class) the
+compact rows of every AVAILABLE listing (id, owner, created_at, price, seat
+type, coach, class) are kept in Django's cache. Excluding the viewer's own
+listings, facet counts, facet filters, price or newest-first order and
+keyset cursors are then worked out on those rows in Python, and only the
+page's listings are loaded, by primary key.
+
+The versions and rows live in SEATSWAP_BROWSE_CACHE_ALIAS, which has to be a
+backend every process reads and writes (file, database, redis, memcached):
+hold sweeps and archive runs happen in their own processes, and each web
+worker bumps only what it changed. With a local-memory alias those bumps
+would never reach another worker's rows, so the cache stays off and browse
+reads the database.
+
+Each route key carries a version number in the cache, and entries are stored
+under the version they were read at. A save or delete of a listing bumps its
+route's version after the transaction commits (see seats.signals), and so do
+the queryset UPDATEs that move listings in or out of AVAILABLE (booking, hold
+release, expiry), so invalidation is one increment and, once it lands, no
+process reads a set older than the change. A version that was evicted comes
+back as a new, time-based number, so entries from before can never match it.
+Entries also expire after SEATSWAP_BROWSE_CACHE_TTL. On the file backend
+``incr`` is a read and a write, so two bumps at once may count as one; the
+version still changes, and the TTL bounds what a reader stores in between.
+
+Routes with more than SEATSWAP_BROWSE_CACHE_MAX_ROWS listings are not cached;
+browse reads those from the database as before.
+
+Hits and misses are counted per route in each process (see ``stats``).
+"""
+
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+# One listing's browse-relevant columns, as cached
+CachedListing = namedtuple('CachedListing', 'id owner_id created_at price seat_type coach_number travel_class')
+
+# Stored in place of rows for a route too large to cache
+TOO_MANY = 'too-many'
+
+
+class BrowseCache:
+    """
+    Route-versioned rows of browse_seats, in a Django cache alias
+
+    Settings:
+        SEATSWAP_BROWSE_CACHE_ALIAS: Django cache alias shared by all processes (default 'browse')
+        SEATSWAP_BROWSE_CACHE_TTL: Seconds a route's rows live (default 300)
+        SEATSWAP_BROWSE_CACHE_MAX_ROWS: Largest route that is cached (default 2000)
+    """
+
+    version_prefix = 'browse:version:'
+    key_prefix = 'browse:rows:'
+
+    def __init__(self):
+        self.route_counters = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[getattr(settings, 'SEATSWAP_BROWSE_CACHE_ALIAS', 'browse')]
+
+    @property
+    def enabled(self):
+        """False for a per-process backend, which other processes' bumps never reach"""
+        return not isinstance(self.shared, LocMemCache)
+
+    def version(self, route):
+        """Current version of a route's rows"""
+        key = f'{self.version_prefix}{route}'
+        version = self.shared.get(key)
+        if version is None:
+            # Never a number used before, so rows cached under an evicted version stay unreachable
+            self.shared.add(key, time.time_ns(), None)
+            version = self.shared.get(key)
+        return version
+
+    def bump(self, routes):
+        """Invalidate every cached result set of ``routes`` (route keys; blanks are ignored)"""
+        for route in set(filter(None, routes)):
+            key = f'{self.version_prefix}{route}'
+            try:
+                self.shared.incr(key)
+            except ValueError:
+                self.shared.set(key, time.time_ns(), None)
+
+    def bump_on_commit(self, routes):
+        """``bump`` once the current transaction commits, so no reader caches what it is about to replace"""
+        routes = set(filter(None, routes))
+        if routes:
+            transaction.on_commit(lambda: self.bump(routes))
+
+    def rows(self, route, queryset, variant=''):
+        """
+        Cached rows of ``queryset``, the listings of ``route`` and ``variant``
+
+        Args:
+            route (str): Route key the queryset is filtered to
+            queryset: AVAILABLE listings of the route, before the viewer's own are excluded
+            variant (str): The queryset's other filters (train, class), part of the cache key
+
+        Returns:
+            list: CachedListing rows, or None when the route is too large to
+            cache or the cache is off
+        """
+        if not self.enabled:
+            return None
+        key = f'{self.key_prefix}{route}:{variant}:{self.version(route)}'
+        rows = self.shared.get(key)
+        self.record(route, hit=rows is not None)
+        if rows == TOO_MANY:
+            return None
+        if rows is None:
+            max_rows = getattr(settings, 'SEATSWAP_BROWSE_CACHE_MAX_ROWS', 2000)
+            rows = list(queryset.order_by().values_list(*CachedListing._fields)[:max_rows + 1])
+            if len(rows) > max_rows:
+                self.shared.set(key, TOO_MANY, getattr(settings, 'SEATSWAP_BROWSE_CACHE_TTL', 300))
+                return None
+            self.shared.set(key, rows, getattr(settings, 'SEATSWAP_BROWSE_CACHE_TTL', 300))
+        return [CachedListing(*row) for row in rows]
+
+    def record(self, route, hit):
+        with self._lock:
+            self.route_counters[(route, 'hits' if hit else 'misses')] += 1
+
+    def clear(self):
+        """Reset this process's counters (cached rows age out or are bumped)"""
+        with self._lock:
+            self.route_counters.clear()
+
+    def stats(self, limit=50):
+        """Hits, misses and hit ratio per route in this process, busiest ``limit`` routes first"""
+        with self._lock:
+            counters = dict(self.route_counters)
+        routes = {}
+        for route in {route for route, _ in counters}:
+            hits, misses = counters.get((route, 'hits'), 0), counters.get((route, 'misses'), 0)
+            routes[route] = {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / (hits + misses), 4)}
+        busiest = sorted(routes, key=lambda route: -(routes[route]['hits'] + routes[route]['misses']))[:limit]
+
+        hits = sum(count for (_, event), count in counters.items() if event == 'hits')
+        lookups = sum(counters.values())
+        return {
+            'hits': hits,
+            'misses': lookups - hits,
+            'hit_ratio': round(hits / lookups, 4) if lookups else None,
+            'routes': {route: routes[route] for route in busiest},
+        }
+
+
+browse_cache = BrowseCache()
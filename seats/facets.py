@@ -0,0 +1,206 @@
+"""
+Facet counts and filters for browsing seat listings.
+
+Listings can be narrowed by seat type, coach, travel class and price bucket.
+Every facet count comes from one GROUP BY over the route queryset: one row
+per (seat type, coach, class, price bucket) with its listing count. Each
+facet is then summed in Python over the rows that match the *other* selected
+facets, so choosing "Lower" still shows how many upper or side berths there
+are. The number of rows is bounded by the combinations on one route and date,
+not by the number of listings. ``facet_counts_from_rows`` and ``select_rows``
+do the same for listings already in memory, such as a route's cached rows.
+
+Price buckets come from SEATSWAP_PRICE_BUCKETS, a rising list of bounds in
+rupees; [200, 500] gives "under 200", "200-500" and "500+".
+"""
+
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, CharField, Count, Value, When
+
+from .models import SeatListing
+
+
+FACETS = ('seat_type', 'coach_number', 'travel_class', 'price_bucket')
+
+# Query string parameter for each facet
+FACET_PARAMS = {
+    'seat_type': 'seat_type',
+    'coach_number': 'coach',
+    'travel_class': 'class',
+    'price_bucket': 'price',
+}
+
+
+def price_buckets():
+    """[(key, low, high)] for the configured bounds; low and high are None at the open ends"""
+    bounds = [Decimal(str(bound)) for bound in getattr(settings, 'SEATSWAP_PRICE_BUCKETS', [200, 500, 1000, 2000])]
+    edges = [None] + bounds + [None]
+    buckets = []
+    for low, high in zip(edges, edges[1:]):
+        if low is None:
+            key = f'under-{high}'
+        elif high is None:
+            key = f'{low}+'
+        else:
+            key = f'{low}-{high}'
+        buckets.append((key, low, high))
+    return buckets
+
+
+def _bucket_label(key):
+    if key.startswith('under-'):
+        return f'Under ₹{key[6:]}'
+    if key.endswith('+'):
+        return f'₹{key[:-1]} and up'
+    low, high = key.split('-')
+    return f'₹{low} - ₹{high}'
+
+
+def price_bucket_expression(buckets):
+    """SQL CASE naming the price bucket of each listing"""
+    whens = [When(price__lt=high, then=Value(key)) for key, _, high in buckets if high is not None]
+    return Case(*whens, default=Value(buckets[-1][0]), output_field=CharField())
+
+
+def price_bucket_of(price, buckets):
+    """Price bucket of one price, as ``price_bucket_expression`` names it"""
+    for key, _, high in buckets:
+        if high is not None and price < high:
+            return key
+    return buckets[-1][0]
+
+
+def parse_selection(params):
+    """Selected facet values from a QueryDict, keyed by facet; unknown price buckets are dropped"""
+    selection = {}
+    for facet, param in FACET_PARAMS.items():
+        value = params.get(param, '').strip()
+        if value:
+            # Coaches are compared case-insensitively, as "b2" and "B2"
+            selection[facet] = value.upper() if facet == 'coach_number' else value
+    if 'price_bucket' in selection and selection['price_bucket'] not in {key for key, _, _ in price_buckets()}:
+        del selection['price_bucket']
+    return selection
+
+
+def apply_selection(queryset, selection):
+    """Narrow ``queryset`` to the selected facet values"""
+    for facet, value in selection.items():
+        if facet == 'price_bucket':
+            _, low, high = next(bucket for bucket in price_buckets() if bucket[0] == value)
+            if low is not None:
+                queryset = queryset.filter(price__gte=low)
+            if high is not None:
+                queryset = queryset.filter(price__lt=high)
+        elif facet == 'coach_number':
+            queryset = queryset.filter(coach_number__iexact=value)
+        else:
+            queryset = queryset.filter(**{facet: value})
+    return queryset
+
+
+def select_rows(listings, selection):
+    """``apply_selection`` for listings already in memory"""
+    buckets = price_buckets()
+    return [
+        listing for listing in listings
+        if all(
+            price_bucket_of(listing.price, buckets) == value if facet == 'price_bucket'
+            else listing.coach_number.upper() == value if facet == 'coach_number'
+            else getattr(listing, facet) == value
+            for facet, value in selection.items()
+        )
+    ]
+
+
+def facet_counts(queryset, selection):
+    """
+    Counts per facet value for ``queryset`` in one query
+
+    Args:
+        queryset: Listings before any facet is applied
+        selection (dict): Selected facet values (see ``parse_selection``)
+
+    Returns:
+        dict: Facet -> list of {'value', 'label', 'count', 'selected'}, in display order
+    """
+    buckets = price_buckets()
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=price_bucket_expression(buckets))
+        .values(*FACETS)
+        .annotate(listings=Count('id'))
+    )
+    return _tally(rows, selection, buckets)
+
+
+def facet_counts_from_rows(listings, selection):
+    """``facet_counts`` for listings already in memory (anything with the facet fields and a price)"""
+    buckets = price_buckets()
+    groups = Counter(
+        (listing.seat_type, listing.coach_number, listing.travel_class, price_bucket_of(listing.price, buckets))
+        for listing in listings
+    )
+    rows = [dict(zip(FACETS, group), listings=count) for group, count in groups.items()]
+    return _tally(rows, selection, buckets)
+
+
+def _tally(rows, selection, buckets):
+    """Facet counts from (facet values, listings) rows, each facet under the other selections only"""
+    counts = {facet: Counter() for facet in FACETS}
+    for row in rows:
+        row['coach_number'] = row['coach_number'].upper()
+        row['travel_class'] = row['travel_class'] or ''
+        for facet in FACETS:
+            if all(row[other] == value for other, value in selection.items() if other != facet):
+                counts[facet][row[facet]] += row['listings']
+
+    seat_types = dict(SeatListing.SEAT_TYPES)
+    bucket_order = {key: position for position, (key, _, _) in enumerate(buckets)}
+    ordering = {
+        'seat_type': lambda value: list(seat_types).index(value) if value in seat_types else len(seat_types),
+        'coach_number': lambda value: value,
+        'travel_class': lambda value: value,
+        'price_bucket': lambda value: bucket_order[value],
+    }
+    labels = {
+        'seat_type': lambda value: seat_types.get(value, value),
+        'coach_number': lambda value: value,
+        'travel_class': lambda value: value,
+        'price_bucket': _bucket_label,
+    }
+
+    facets = {}
+    for facet in FACETS:
+        selected = selection.get(facet, '')
+        facets[facet] = [
+            {'value': value, 'label': labels[facet](value), 'count': count, 'selected': value == selected}
+            for value, count in sorted(counts[facet].items(), key=lambda item: ordering[facet](item[0]))
+            if count and value
+        ]
+    return facets
+
+
+def facet_query(params, facet, value, selected=False):
+    """Query string that selects ``value`` for ``facet`` (or clears it if ``selected``), from page one"""
+    params = params.copy()
+    params.pop('cursor', None)
+    params.pop('format', None)
+    param = FACET_PARAMS[facet]
+    if selected:
+        params.pop(param, None)
+    else:
+        params[param] = value
+    return params.urlencode()
+
+
+def with_queries(facets, params):
+    """Add a 'query' to every facet value for the template's links"""
+    for facet, values in facets.items():
+        for entry in values:
+            entry['query'] = facet_query(params, facet, entry['value'], entry['selected'])
+    return facets
+
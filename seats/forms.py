@@ -1,7 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import SeatListing, UserProfile
+from .models import SeatListing, SeatRequest, UserProfile
 
 
 class UserRegistrationForm(UserCreationForm):
@@ -66,6 +66,31 @@ class SeatListingForm(forms.ModelForm):
         self.fields['description'].required = False
 
 
+class SeatRequestForm(forms.ModelForm):
+    class Meta:
+        model = SeatRequest
+        fields = ['train_number', 'journey_date', 'travel_class', 'seat_type', 'coach_prefix', 'max_price']
+        widgets = {
+            'train_number': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g., 12185'}),
+            'journey_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'travel_class': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g., 3A (blank for any)'}),
+            'seat_type': forms.Select(attrs={'class': 'form-control'}),
+            'coach_prefix': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g., B (blank for any)'}),
+            'max_price': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Highest price in INR'}),
+        }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['seat_type'].choices = [('', 'Any berth')] + list(SeatListing.SEAT_TYPES)
+        self.fields['coach_prefix'].help_text = "Matches coaches starting with this, e.g. B for B1-B9"
+    
+    def clean_travel_class(self):
+        return self.cleaned_data['travel_class'].strip().upper()
+    
+    def clean_coach_prefix(self):
+        return self.cleaned_data['coach_prefix'].strip().upper()
+
+
 class PNRForm(forms.Form):
     pnr_number = forms.CharField(
         max_length=10,
@@ -0,0 +1,103 @@
+"""
+Timed seat holds.
+
+Booking a seat moves its listing to BOOKED and opens a PENDING exchange that
+holds the seat until ``hold_expires_at`` (SEATSWAP_HOLD_SECONDS after the
+claim). A buyer who never pays must not keep the seat off the market, so the
+sweeper cancels expired PENDING exchanges and puts their listings back on
+sale. It finds them through seats_exchange_hold_idx on (payment_status,
+hold_expires_at), which holds only a thin slice of PENDING rows at the front
+of its range however many paid or cancelled exchanges pile up, and releases
+them in batches of conditional UPDATEs so a late payment and the sweeper can
+never both win.
+
+Run the sweeper with ``python manage.py release_expired_holds`` (from cron),
+or set SEATSWAP_HOLD_SWEEP_INTERVAL to run it on a daemon thread in every
+process.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .browse_cache import browse_cache
+from .models import SeatExchange, SeatListing
+
+
+logger = logging.getLogger(__name__)
+
+
+def hold_expiry(now=None):
+    """When a hold taken at ``now`` runs out"""
+    return (now or timezone.now()) + timedelta(seconds=getattr(settings, 'SEATSWAP_HOLD_SECONDS', 15 * 60))
+
+
+def release_expired_holds(now=None, batch_size=500):
+    """
+    Cancel PENDING exchanges whose hold has run out and make their listings AVAILABLE again
+
+    Each batch is one indexed SELECT and two conditional UPDATEs in a short
+    transaction: an exchange paid since the SELECT no longer matches
+    ``payment_status='PENDING'`` and keeps its seat.
+
+    Args:
+        now (datetime): Cut-off; holds expiring at or before it are released
+        batch_size (int): Exchanges released per transaction
+
+    Returns:
+        int: Exchanges cancelled
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        expired = list(
+            SeatExchange.objects.filter(payment_status='PENDING', hold_expires_at__lte=now)
+            .order_by('hold_expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not expired:
+            return released
+        with transaction.atomic():
+            SeatExchange.objects.filter(id__in=expired, payment_status='PENDING').update(
+                payment_status='CANCELLED', completion_date=now,
+            )
+            # Only the exchanges this batch cancelled give their seats back
+            listings = dict(SeatExchange.objects.filter(
+                id__in=expired, payment_status='CANCELLED', completion_date=now,
+            ).values_list('seat_listing_id', 'seat_listing__route_key'))
+            listing_ids = list(listings)
+            SeatListing.objects.filter(id__in=listing_ids, status='BOOKED').update(
+                status='AVAILABLE', updated_at=now,
+            )
+            browse_cache.bump_on_commit(listings.values())
+            released += len(listing_ids)
+        if len(expired) < batch_size:
+            return released
+
+
+def start_hold_sweeper(interval):
+    """
+    Release expired holds every ``interval`` seconds on a daemon thread
+
+    Returns:
+        threading.Event: Set it to stop the thread
+    """
+    stopped = threading.Event()
+
+    def sweep():
+        while not stopped.wait(interval):
+            try:
+                released = release_expired_holds()
+                if released:
+                    logger.info('Released %d expired seat holds', released)
+            except Exception:
+                logger.exception('Releasing expired seat holds failed')
+            finally:
+                close_old_connections()
+
+    threading.Thread(target=sweep, name='seat-hold-sweeper', daemon=True).start()
+    return stopped
@@ -0,0 +1,111 @@
+"""
+Coach layouts and berth proximity.
+
+Each class has a fixed berth numbering: a sleeper (SL) or 3A coach repeats
+bays of eight (lower, middle, upper on both sides, then side lower and side
+upper), 2A has bays of six without middles, 1A cabins of four, and a chair
+car (CC) rows of five seats (3 + 2). The tables below are built once at import
+and indexed by berth number, so looking up a berth's bay, position and type is
+a tuple index.
+
+``nearest`` ranks seats by how close they are to a traveller's own berth:
+same coach first (then the nearest coach of the same series), then the
+nearest bay, then the nearest berth number. Only the best ``k`` are kept, with
+a heap, so ranking a train's worth of listings does not sort all of them.
+"""
+
+import heapq
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+
+Berth = namedtuple('Berth', 'bay position berth_type')
+
+SLEEPER_BAY = ('LOWER', 'MIDDLE', 'UPPER', 'LOWER', 'MIDDLE', 'UPPER', 'SIDE_LOWER', 'SIDE_UPPER')
+
+
+def _layout(berths, bay):
+    """Berth number -> Berth for a coach of ``berths`` berths repeating ``bay``; index 0 is unused"""
+    return (None,) + tuple(
+        Berth(number // len(bay), number % len(bay), bay[number % len(bay)]) for number in range(berths)
+    )
+
+
+COACH_LAYOUTS = {
+    'SL': _layout(72, SLEEPER_BAY),
+    '3A': _layout(64, SLEEPER_BAY),
+    '2A': _layout(48, ('LOWER', 'UPPER', 'LOWER', 'UPPER', 'SIDE_LOWER', 'SIDE_UPPER')),
+    '1A': _layout(24, ('LOWER', 'UPPER', 'LOWER', 'UPPER')),
+    'CC': _layout(78, ('WINDOW', 'MIDDLE', 'AISLE', 'AISLE', 'WINDOW')),
+}
+
+# Gap used when a coach or berth cannot be placed, so such seats rank last
+FAR = 999
+
+
+def berth_info(travel_class, berth_no):
+    """Bay, position and type of a berth in a class's coach, or None if unknown"""
+    layout = COACH_LAYOUTS.get((travel_class or '').upper())
+    try:
+        number = int(berth_no)
+    except (TypeError, ValueError):
+        return None
+    if layout is None or not 0 < number < len(layout):
+        return None
+    return layout[number]
+
+
+@lru_cache(maxsize=4096)
+def _coach_series(coach_number):
+    """("B", 3) for "B3"; (coach, None) when there is no trailing number"""
+    match = re.fullmatch(r'([A-Z]*)(\d+)', (coach_number or '').strip().upper())
+    if not match:
+        return (coach_number or '').strip().upper(), None
+    return match.group(1), int(match.group(2))
+
+
+def coach_gap(coach, other):
+    """0 for the same coach, the number of coaches apart within a series (B1..B9), else FAR"""
+    (series, number), (other_series, other_number) = _coach_series(coach), _coach_series(other)
+    if series != other_series:
+        return FAR
+    if number is None or other_number is None:
+        return 0 if number == other_number else FAR
+    return abs(number - other_number)
+
+
+def proximity(travel_class, coach, berth_no, other_coach, other_berth_no):
+    """Sort key of a seat relative to a traveller's berth: (coach gap, bay gap, berth gap), smaller is closer"""
+    gap = coach_gap(coach, other_coach)
+    origin, target = berth_info(travel_class, berth_no), berth_info(travel_class, other_berth_no)
+    if origin is None or target is None:
+        return gap, FAR, FAR
+    return gap, abs(origin.bay - target.bay), abs(int(berth_no) - int(other_berth_no))
+
+
+def nearest(listings, travel_class, coach, berth_no, k):
+    """
+    The ``k`` listings closest to ``coach``/``berth_no``, closest first
+
+    Args:
+        listings (iterable): SeatListing rows; only coach_number, seat_number
+            and travel_class are read
+        travel_class (str): Class whose layout applies when a listing has none
+        coach (str): Traveller's coach, e.g. "B3"
+        berth_no: Traveller's berth number
+        k (int): How many to keep
+
+    Returns:
+        list: Up to ``k`` listings
+    """
+    # A train has a few hundred distinct seats however many listings there are
+    keys = {}
+
+    def key(listing):
+        seat = (listing.travel_class or travel_class, listing.coach_number, listing.seat_number)
+        if seat not in keys:
+            keys[seat] = proximity(seat[0], coach, berth_no, seat[1], seat[2])
+        return keys[seat]
+
+    return heapq.nsmallest(k, listings, key=key)
@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from seats.retention import (
+    archive_past_journeys, archive_path, expire_past_listings, open_archive, retention_cutoff,
+)
+
+
+class Command(BaseCommand):
+    help = ('Expire listings whose journey has passed, then move rows for journeys older than the '
+            'retention window to a gzipped archive file, in short chunks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Journeys kept in the database (default SEATSWAP_RETENTION_DAYS)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows moved per transaction')
+        parser.add_argument('--archive-dir', default=None, help='Where archive files go (default SEATSWAP_ARCHIVE_DIR)')
+        parser.add_argument('--expire-only', action='store_true', help='Only expire past listings, archive nothing')
+
+    def report(self, label, rows, seconds):
+        self.stdout.write(f'  {label}: {rows} rows in {seconds * 1000:.0f}ms')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        today = timezone.localdate()
+        expired = expire_past_listings(today, batch_size=options['chunk_size'], report=self.report)
+        self.stdout.write(f'Expired {expired} past listings')
+        if options['expire_only']:
+            return
+
+        if options['days'] is None:
+            cutoff = retention_cutoff(today)
+        else:
+            cutoff = today - timedelta(days=options['days'])
+        path = archive_path(options['archive_dir'])
+        with open_archive(path) as stream:
+            moved = archive_past_journeys(stream, cutoff, options['chunk_size'], report=self.report)
+        if not any(moved.values()):
+            path.unlink()
+
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f'{rows} {label}' for label, rows in moved.items() if rows) or 'nothing'
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {summary} for journeys before {cutoff}'
+            + (f' to {path}' if any(moved.values()) else '') + f' in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from seats.models import SeatListing
+from seats.schedules import assign_listing_stops
+
+
+class Command(BaseCommand):
+    help = 'Fill in route stop numbers on open listings that lack them, one schedule lookup per train'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Listings written per statement')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        listings = (
+            SeatListing.objects.filter(status='AVAILABLE', source_stop__isnull=True)
+            .order_by('train_number')
+            .only('id', 'train_number', 'source_station_code', 'destination_station_code')
+        )
+
+        batch, assigned, unknown = [], 0, 0
+        for listing in listings.iterator():
+            # Schedules are cached per train, so each train costs at most one upstream call
+            if assign_listing_stops(listing):
+                batch.append(listing)
+            else:
+                unknown += 1
+            if len(batch) >= options['batch_size']:
+                assigned += SeatListing.objects.bulk_update(batch, ['source_stop', 'destination_stop'])
+                batch = []
+        if batch:
+            assigned += SeatListing.objects.bulk_update(batch, ['source_stop', 'destination_stop'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Assigned stops to {assigned} listings, {unknown} not on a known route, in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from seats.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = 'Run a SeatSwap performance benchmark (seeded data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Benchmark to run: ' + ', '.join(sorted(BENCHMARKS)))
+        parser.add_argument('--size', type=int, help='Number of rows/items to seed')
+        parser.add_argument('--repeat', type=int, help='Timed repetitions per measurement')
+
+    def handle(self, *args, **options):
+        name = options['name']
+        if name not in BENCHMARKS:
+            raise CommandError(f'Unknown benchmark "{name}". Choose from: {", ".join(sorted(BENCHMARKS))}')
+
+        kwargs = {key: options[key] for key in ('size', 'repeat') if options[key] is not None}
+        BENCHMARKS[name](self.stdout.write, **kwargs)
+        self.stdout.write(self.style.SUCCESS(f'Benchmark "{name}" finished'))
@@ -1,41 +1,118 @@
-from django.core.management.base import BaseCommand
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from seats.models import StationCode
+from seats.stations import bump_station_version
+
+
+# Built-in stations loaded when no dataset file is given (handy for development)
+SAMPLE_STATIONS = [
+    ('NDLS', 'New Delhi', 'Delhi'),
+    ('BCT', 'Mumbai Central', 'Maharashtra'),
+    ('HWH', 'Howrah Junction', 'West Bengal'),
+    ('MAS', 'Chennai Central', 'Tamil Nadu'),
+    ('SBC', 'Bengaluru City', 'Karnataka'),
+    ('HYB', 'Hyderabad', 'Telangana'),
+    ('PUNE', 'Pune Junction', 'Maharashtra'),
+    ('JP', 'Jaipur Junction', 'Rajasthan'),
+    ('LKO', 'Lucknow', 'Uttar Pradesh'),
+    ('BPL', 'Bhopal Junction', 'Madhya Pradesh'),
+    ('KOAA', 'Kolkata', 'West Bengal'),
+    ('ADI', 'Ahmedabad Junction', 'Gujarat'),
+    ('BBS', 'Bhubaneswar', 'Odisha'),
+    ('TVC', 'Thiruvananthapuram Central', 'Kerala'),
+    ('GHY', 'Guwahati', 'Assam'),
+    ('PNBE', 'Patna Junction', 'Bihar'),
+    ('CDG', 'Chandigarh', 'Chandigarh'),
+    ('JU', 'Jodhpur Junction', 'Rajasthan'),
+    ('UDZ', 'Udaipur City', 'Rajasthan'),
+    ('BKN', 'Bikaner Junction', 'Rajasthan'),
+]
+
+# Accepted column / property names for each field, first match wins
+CODE_KEYS = ('station_code', 'code', 'stationCode')
+NAME_KEYS = ('station_name', 'name', 'stationName')
+STATE_KEYS = ('state', 'state_name')
+
+
+def _first(record, keys):
+    for key in keys:
+        value = record.get(key)
+        if value not in (None, ''):
+            return str(value).strip()
+    return ''
+
+
+def read_records(path):
+    """
+    Yield raw station dicts from a CSV file (with a header row) or a JSON file
+
+    JSON may be a list of objects, an object with a "stations" list, or a
+    GeoJSON FeatureCollection whose features carry the fields in "properties".
+    """
+    if path.lower().endswith('.json'):
+        with open(path, encoding='utf-8') as handle:
+            data = json.load(handle)
+        if isinstance(data, dict):
+            data = data.get('features') or data.get('stations') or []
+        for record in data:
+            yield record.get('properties', record) if isinstance(record, dict) else {}
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            yield from csv.DictReader(handle)
+
+
+def parse_stations(records):
+    """Normalise raw records to (code, name, state), skipping rows without a code or name"""
+    for record in records:
+        code = _first(record, CODE_KEYS).upper()
+        name = _first(record, NAME_KEYS)
+        if code and name:
+            yield code, name, _first(record, STATE_KEYS) or None
+
 
 class Command(BaseCommand):
-    help = 'Load sample station codes'
+    help = 'Load station codes from a CSV/JSON dataset (or the built-in samples) in bulk; safe to re-run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='CSV or JSON station dataset; omit to load the built-in samples')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Stations written per statement')
 
     def handle(self, *args, **options):
-        stations = [
-            ('NDLS', 'New Delhi', 'Delhi'),
-            ('BCT', 'Mumbai Central', 'Maharashtra'),
-            ('HWH', 'Howrah Junction', 'West Bengal'),
-            ('MAS', 'Chennai Central', 'Tamil Nadu'),
-            ('SBC', 'Bengaluru City', 'Karnataka'),
-            ('HYB', 'Hyderabad', 'Telangana'),
-            ('PUNE', 'Pune Junction', 'Maharashtra'),
-            ('JP', 'Jaipur Junction', 'Rajasthan'),
-            ('LKO', 'Lucknow', 'Uttar Pradesh'),
-            ('BPL', 'Bhopal Junction', 'Madhya Pradesh'),
-            ('KOAA', 'Kolkata', 'West Bengal'),
-            ('ADI', 'Ahmedabad Junction', 'Gujarat'),
-            ('BBS', 'Bhubaneswar', 'Odisha'),
-            ('TVC', 'Thiruvananthapuram Central', 'Kerala'),
-            ('GHY', 'Guwahati', 'Assam'),
-            ('PNBE', 'Patna Junction', 'Bihar'),
-            ('CDG', 'Chandigarh', 'Chandigarh'),
-            ('JU', 'Jodhpur Junction', 'Rajasthan'),
-            ('UDZ', 'Udaipur City', 'Rajasthan'),
-            ('BKN', 'Bikaner Junction', 'Rajasthan'),
-        ]
-        
-        for code, name, state in stations:
-            station, created = StationCode.objects.get_or_create(
-                station_code=code,
-                defaults={'station_name': name, 'state': state}
-            )
-            if created:
-                self.stdout.write(f'Created station: {code} - {name}')
-            else:
-                self.stdout.write(f'Station already exists: {code} - {name}')
-        
-        self.stdout.write(self.style.SUCCESS('Successfully loaded station codes'))
+        path = options['path']
+        if path and not os.path.exists(path):
+            raise CommandError(f'Station file not found: {path}')
+        stations = parse_stations(read_records(path)) if path else iter(SAMPLE_STATIONS)
+
+        started = time.perf_counter()
+        existing = StationCode.objects.count()
+        loaded = 0
+        while True:
+            # Later rows win when a code repeats; one upsert must not touch a row twice
+            chunk = {code: (name, state) for code, name, state in islice(stations, options['batch_size'])}
+            if not chunk:
+                break
+            with transaction.atomic():
+                StationCode.objects.bulk_create(
+                    [StationCode(station_code=code, station_name=name, state=state)
+                     for code, (name, state) in chunk.items()],
+                    update_conflicts=True,
+                    unique_fields=['station_code'],
+                    update_fields=['station_name', 'state'],
+                )
+            loaded += len(chunk)
+            self.stdout.write(f'  {loaded} stations loaded')
+
+        # Bulk upserts send no signals, so tell the station indexes directly
+        bump_station_version()
+        created = StationCode.objects.count() - existing
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully loaded {loaded} station codes ({created} new, {loaded - created} updated) '
+            f'in {elapsed:.1f}s'
+        ))
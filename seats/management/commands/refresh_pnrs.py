@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from railway_api import get_railway_api_client
+from seats.models import SeatExchange, SeatListing, UserProfile
+from seats.stations import name_pnr_stations
+from seats.swaps import propose_swaps
+from seats.views import store_pnr_statuses
+
+
+def tracked_pnrs(include_past=False):
+    """Distinct PNRs referenced by open listings, user journeys and exchanges, in one UNION query"""
+    listings = SeatListing.objects.filter(status__in=['AVAILABLE', 'BOOKED'])
+    profiles = UserProfile.objects.exclude(current_pnr__isnull=True).exclude(current_pnr='')
+    exchanges = SeatExchange.objects.exclude(payment_status='CANCELLED')
+    if not include_past:
+        today = timezone.localdate()
+        listings = listings.filter(journey_date__gte=today)
+        profiles = profiles.filter(journey_date__gte=today)
+        exchanges = exchanges.filter(seat_listing__journey_date__gte=today)
+
+    # order_by() drops the models' default ordering, which UNION does not allow
+    return listings.order_by().values_list('pnr_number', flat=True).union(
+        profiles.order_by().values_list('current_pnr', flat=True),
+        exchanges.order_by().values_list('buyer_pnr', flat=True),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Re-fetch the status of every tracked PNR in parallel and store it in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Concurrent upstream lookups (keep within the client connection pool size)')
+        parser.add_argument('--batch-size', type=int, default=100, help='PNRs stored per transaction')
+        parser.add_argument('--include-past', action='store_true', help='Also refresh journeys that have ended')
+        parser.add_argument('--max-swap-length', type=int, default=3,
+                            help='Most travellers in one proposed swap cycle on charted trains (0 to skip)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        pnrs = list(tracked_pnrs(options['include_past']))
+        self.stdout.write(f'Refreshing {len(pnrs)} PNRs with {options["workers"]} workers')
+
+        client = get_railway_api_client()
+        batch, stored, failed = [], 0, 0
+        charted = set()
+        for pnr_number, pnr_data in client.get_pnr_status_many(pnrs, max_workers=options['workers']):
+            if not pnr_data:
+                failed += 1
+                continue
+            batch.append((pnr_number, pnr_data))
+            if pnr_data.get('chart_prepared'):
+                charted.add((pnr_data.get('train_number', ''), pnr_data.get('journey_date')))
+            if len(batch) >= options['batch_size']:
+                stored += self.store(batch)
+                batch = []
+                self.stdout.write(f'  {stored + failed}/{len(pnrs)} done')
+        stored += self.store(batch)
+
+        # Berths are final once the chart is out: propose swap cycles for those trains
+        if options['max_swap_length'] >= 2:
+            groups = sum(len(propose_swaps(train_number, journey_date, options['max_swap_length']))
+                         for train_number, journey_date in sorted(charted, key=str))
+            self.stdout.write(f'Proposed {groups} swap groups on {len(charted)} charted trains')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {stored} PNRs, {failed} failed, in {elapsed:.1f}s'
+        ))
+
+    def store(self, batch):
+        # One station lookup for the whole batch
+        name_pnr_stations([pnr_data for _, pnr_data in batch])
+        return store_pnr_statuses(batch)
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from seats.holds import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Cancel unpaid exchanges whose seat hold has run out and put their seats back on sale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Exchanges released per transaction')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        released = release_expired_holds(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired seat holds in {elapsed:.2f}s'))
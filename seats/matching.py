@@ -0,0 +1,111 @@
+"""
+Matching seat listings to open "wanted seat" requests.
+
+Open requests are bucketed by (train, journey date, travel class, berth type),
+and seats_request_bucket_idx makes every bucket one index range. A blank class
+or berth type on a request means "any", so a listing can satisfy at most four
+buckets: its own class and berth, either one left open, or both. Matching a
+batch of listings reads those buckets with one query per (train, date) and
+routes each request to the listings of its bucket through a dict, so the cost
+grows with the listings and their buckets, never with the number of open
+requests overall. The remaining criteria (coach prefix, price ceiling, not
+your own seat) are checked on the few rows a bucket holds, and every match of
+the batch is written with one bulk insert.
+
+A listing whose class is unknown (NULL: its PNR could not be read when it
+was listed) may be of any class, so, as in browse, it satisfies requests for
+every class; a batch holding one reads every class's buckets for its berth.
+
+A new request does the reverse, looking up available listings for its train
+and date through seats_listing_class_idx.
+"""
+
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .models import SeatListing, SeatMatch, SeatRequest
+
+
+ANY = ''
+
+
+def _satisfies(seat_request, listing):
+    """Criteria outside the bucket key"""
+    if seat_request.requester_id == listing.owner_id:
+        return False
+    if seat_request.coach_prefix and not listing.coach_number.upper().startswith(seat_request.coach_prefix.upper()):
+        return False
+    return seat_request.max_price is None or listing.price <= seat_request.max_price
+
+
+def _record(pairs):
+    """Insert (request id, listing id) matches in one statement; already recorded pairs are skipped"""
+    if not pairs:
+        return 0
+    SeatMatch.objects.bulk_create(
+        [SeatMatch(seat_request_id=request_id, listing_id=listing_id) for request_id, listing_id in pairs],
+        ignore_conflicts=True,
+    )
+    return len(pairs)
+
+
+def match_listings(listings):
+    """
+    Record a match for every open request that an available listing satisfies
+
+    Args:
+        listings (iterable): SeatListing instances; only AVAILABLE ones are matched
+
+    Returns:
+        int: Candidate matches written (pairs recorded earlier are not duplicated)
+    """
+    by_journey = defaultdict(list)
+    for listing in listings:
+        if listing.status == 'AVAILABLE':
+            by_journey[(listing.train_number, listing.journey_date)].append(listing)
+
+    pairs = []
+    for (train_number, journey_date), journey_listings in by_journey.items():
+        seat_types = {ANY} | {listing.seat_type for listing in journey_listings}
+        open_requests = SeatRequest.objects.filter(
+            status='OPEN', train_number=train_number, journey_date=journey_date, seat_type__in=seat_types,
+        )
+        if all(listing.travel_class for listing in journey_listings):
+            open_requests = open_requests.filter(
+                travel_class__in={ANY} | {listing.travel_class for listing in journey_listings},
+            )
+        buckets = defaultdict(list)
+        for seat_request in open_requests.order_by().only('id', 'requester_id', 'travel_class', 'seat_type', 'coach_prefix', 'max_price'):
+            buckets[(seat_request.travel_class, seat_request.seat_type)].append(seat_request)
+
+        for listing in journey_listings:
+            if listing.travel_class:
+                keys = {(listing.travel_class, listing.seat_type), (listing.travel_class, ANY),
+                        (ANY, listing.seat_type), (ANY, ANY)}
+            else:
+                keys = [key for key in buckets if key[1] in (listing.seat_type, ANY)]
+            for key in keys:
+                for seat_request in buckets.get(key, ()):
+                    if _satisfies(seat_request, listing):
+                        pairs.append((seat_request.id, listing.id))
+    return _record(pairs)
+
+
+def match_request(seat_request):
+    """Record matches between one open request and the listings already available for it"""
+    if seat_request.status != 'OPEN':
+        return 0
+    listings = SeatListing.objects.filter(
+        status='AVAILABLE', train_number=seat_request.train_number, journey_date=seat_request.journey_date,
+    ).exclude(owner_id=seat_request.requester_id)
+    if seat_request.travel_class:
+        listings = listings.filter(Q(travel_class=seat_request.travel_class) | Q(travel_class__isnull=True))
+    if seat_request.seat_type:
+        listings = listings.filter(seat_type=seat_request.seat_type)
+    if seat_request.coach_prefix:
+        listings = listings.filter(coach_number__istartswith=seat_request.coach_prefix)
+    if seat_request.max_price is not None:
+        listings = listings.filter(price__lte=seat_request.max_price)
+    return _record([(seat_request.id, listing_id)
+                    for listing_id in listings.order_by().values_list('id', flat=True)])
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0005_seatlisting_route_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='seatexchange',
+            index=models.Index(fields=['payment_status', 'exchange_date'], name='seats_exchange_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='seatlisting',
+            index=models.Index(fields=['train_number', 'journey_date'], name='seats_listing_train_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0006_exchange_console_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pnrstatus',
+            name='chart_prepared',
+            field=models.BooleanField(default=False),
+        ),
+    ]
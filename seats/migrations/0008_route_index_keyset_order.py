@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0007_pnrstatus_chart_prepared'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='seatlisting',
+            name='seats_listing_route_idx',
+        ),
+        migrations.AddIndex(
+            model_name='seatlisting',
+            index=models.Index(fields=['status', 'source_station_code', 'destination_station_code', 'journey_date', 'created_at', 'id'], name='seats_listing_route_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:32
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicate_passengers(apps, schema_editor):
+    """Keep the newest row per (pnr_status, passenger_serial_number) so the constraint can be added"""
+    PassengerDetails = apps.get_model('seats', 'PassengerDetails')
+    duplicates = (
+        PassengerDetails.objects.order_by()
+        .values('pnr_status', 'passenger_serial_number')
+        .annotate(rows=Count('id'), keep=Max('id'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        PassengerDetails.objects.filter(
+            pnr_status=duplicate['pnr_status'],
+            passenger_serial_number=duplicate['passenger_serial_number'],
+        ).exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0008_route_index_keyset_order'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_passengers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='passengerdetails',
+            constraint=models.UniqueConstraint(fields=('pnr_status', 'passenger_serial_number'), name='seats_passenger_serial_uniq'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0009_passengerdetails_serial_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Train',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('train_number', models.CharField(max_length=10, unique=True)),
+                ('train_name', models.CharField(blank=True, max_length=100)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrainStop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveIntegerField()),
+                ('station_code', models.CharField(max_length=10)),
+                ('station_name', models.CharField(blank=True, max_length=100)),
+                ('arrival_time', models.CharField(blank=True, max_length=5)),
+                ('departure_time', models.CharField(blank=True, max_length=5)),
+                ('distance', models.IntegerField(default=0)),
+                ('day', models.PositiveSmallIntegerField(default=1)),
+                ('train', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stops', to='seats.train')),
+            ],
+            options={
+                'ordering': ['train', 'sequence'],
+                'indexes': [models.Index(fields=['station_code', 'train'], name='seats_trainstop_station_idx')],
+                'constraints': [models.UniqueConstraint(fields=('train', 'sequence'), name='seats_trainstop_seq_uniq')],
+            },
+        ),
+    ]
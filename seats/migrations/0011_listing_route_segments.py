@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0010_train_schedules'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seatlisting',
+            name='destination_stop',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='seatlisting',
+            name='source_stop',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='train_number',
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='seatlisting',
+            index=models.Index(fields=['status', 'train_number', 'journey_date', 'source_stop', 'destination_stop'], name='seats_listing_segment_idx'),
+        ),
+    ]
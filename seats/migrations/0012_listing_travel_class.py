@@ -0,0 +1,66 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def _known_travel_class(travel_class):
+    """Same as seats.views.known_travel_class, frozen for this migration"""
+    travel_class = (travel_class or '').strip().upper()
+    return None if travel_class in ('', 'N/A') else travel_class
+
+
+def backfill_travel_class(apps, schema_editor):
+    """Copy travel_class from each listing's stored PNR, a batch of listings at a time"""
+    SeatListing = apps.get_model('seats', 'SeatListing')
+    PNRStatus = apps.get_model('seats', 'PNRStatus')
+    last_id = 0
+    while True:
+        batch = list(
+            SeatListing.objects.filter(id__gt=last_id, travel_class__isnull=True)
+            .order_by('id').only('id', 'pnr_number')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        classes = {
+            pnr_number: _known_travel_class(travel_class)
+            for pnr_number, travel_class in PNRStatus.objects.filter(
+                pnr_number__in={listing.pnr_number for listing in batch},
+            ).values_list('pnr_number', 'travel_class')
+        }
+        updated = []
+        for listing in batch:
+            if classes.get(listing.pnr_number):
+                listing.travel_class = classes[listing.pnr_number]
+                updated.append(listing)
+        SeatListing.objects.bulk_update(updated, ['travel_class'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0011_listing_route_segments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='seatlisting',
+            name='seats_listing_train_idx',
+        ),
+        migrations.AddField(
+            model_name='seatlisting',
+            name='travel_class',
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        # Before the index exists, so the backfill does not maintain it row by row
+        migrations.RunPython(backfill_travel_class, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='seatlisting',
+            index=models.Index(fields=['train_number', 'journey_date', 'travel_class', 'status'], name='seats_listing_class_idx'),
+        ),
+    ]
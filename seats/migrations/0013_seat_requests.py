@@ -0,0 +1,54 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0012_listing_travel_class'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('train_number', models.CharField(max_length=10)),
+                ('journey_date', models.DateField()),
+                ('travel_class', models.CharField(blank=True, default='', max_length=10)),
+                ('seat_type', models.CharField(blank=True, choices=[('LOWER', 'Lower'), ('MIDDLE', 'Middle'), ('UPPER', 'Upper'), ('SIDE_LOWER', 'Side Lower'), ('SIDE_UPPER', 'Side Upper')], default='', max_length=20)),
+                ('coach_prefix', models.CharField(blank=True, default='', max_length=10)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('FULFILLED', 'Fulfilled'), ('CANCELLED', 'Cancelled')], default='OPEN', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('requester', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_requests', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SeatMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='request_matches', to='seats.seatlisting')),
+                ('seat_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='seats.seatrequest')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='seatrequest',
+            index=models.Index(fields=['status', 'train_number', 'journey_date', 'travel_class', 'seat_type'], name='seats_request_bucket_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='seatmatch',
+            constraint=models.UniqueConstraint(fields=('seat_request', 'listing'), name='seats_match_uniq'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0013_seat_requests'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SwapGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('train_number', models.CharField(max_length=10)),
+                ('journey_date', models.DateField()),
+                ('status', models.CharField(choices=[('PROPOSED', 'Proposed'), ('ACCEPTED', 'Accepted'), ('CANCELLED', 'Cancelled')], default='PROPOSED', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['train_number', 'journey_date', 'status'], name='seats_swapgroup_train_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SwapMove',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gives', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='seats.passengerdetails')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moves', to='seats.swapgroup')),
+                ('receives', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='seats.passengerdetails')),
+                ('seat_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swap_moves', to='seats.seatrequest')),
+                ('traveller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swap_moves', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-16 23:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0014_swap_groups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='seatlisting',
+            index=models.Index(fields=['status', 'source_station_code', 'destination_station_code', 'journey_date', 'price', 'id'], name='seats_listing_route_price_idx'),
+        ),
+    ]
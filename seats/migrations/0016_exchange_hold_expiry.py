@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:02
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_hold_expiry(apps, schema_editor):
+    """Give exchanges already awaiting payment the standard hold from when they were booked"""
+    SeatExchange = apps.get_model('seats', 'SeatExchange')
+    SeatExchange.objects.filter(payment_status='PENDING', hold_expires_at__isnull=True).update(
+        hold_expires_at=F('exchange_date') + timedelta(seconds=getattr(settings, 'SEATSWAP_HOLD_SECONDS', 15 * 60)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0015_listing_route_price_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seatexchange',
+            name='hold_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # Only PENDING rows are touched, so one statement; before the index so it is built once
+        migrations.RunPython(backfill_hold_expiry, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='seatexchange',
+            index=models.Index(fields=['payment_status', 'hold_expires_at'], name='seats_exchange_hold_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0016_exchange_hold_expiry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='seatlisting',
+            name='status',
+            field=models.CharField(choices=[('AVAILABLE', 'Available'), ('BOOKED', 'Booked'), ('COMPLETED', 'Completed'), ('CANCELLED', 'Cancelled'), ('EXPIRED', 'Expired')], default='AVAILABLE', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='pnrstatus',
+            index=models.Index(fields=['journey_date'], name='seats_pnr_journey_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='seatlisting',
+            index=models.Index(fields=['status', 'journey_date'], name='seats_listing_journey_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='seatrequest',
+            index=models.Index(fields=['journey_date'], name='seats_request_journey_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='swapgroup',
+            index=models.Index(fields=['journey_date'], name='seats_swapgroup_journey_idx'),
+        ),
+    ]
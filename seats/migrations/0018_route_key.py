@@ -0,0 +1,73 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def _route_key(row):
+    """Same as seats.models.route_key, frozen for this migration"""
+    source_code = (row.source_station_code or '').strip().upper()
+    destination_code = (row.destination_station_code or '').strip().upper()
+    if not (source_code and destination_code and row.journey_date):
+        return ''
+    return f'{source_code}|{destination_code}|{row.journey_date}'
+
+
+def backfill_route_keys(apps, schema_editor):
+    """Compute route_key for existing listings and profiles, a batch of rows at a time"""
+    for model_name in ('SeatListing', 'UserProfile'):
+        model = apps.get_model('seats', model_name)
+        last_id = 0
+        while True:
+            batch = list(
+                model.objects.filter(id__gt=last_id).order_by('id')
+                .only('id', 'source_station_code', 'destination_station_code', 'journey_date')[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for row in batch:
+                row.route_key = _route_key(row)
+            model.objects.bulk_update(batch, ['route_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0017_journey_retention'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='seatlisting',
+            name='seats_listing_route_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='seatlisting',
+            name='seats_listing_route_price_idx',
+        ),
+        migrations.AddField(
+            model_name='seatlisting',
+            name='route_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='route_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        # Before the indexes exist, so the backfill does not maintain them row by row
+        migrations.RunPython(backfill_route_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='seatlisting',
+            index=models.Index(fields=['status', 'route_key', 'created_at', 'id'], name='seats_listing_route_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='seatlisting',
+            index=models.Index(fields=['status', 'route_key', 'price', 'id'], name='seats_listing_route_price_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-17 09:12
+
+from django.db import migrations
+from django.db.models import Q
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_train_number(apps, schema_editor):
+    """Copy train_number from each profile's current stored PNR, a batch of profiles at a time"""
+    UserProfile = apps.get_model('seats', 'UserProfile')
+    PNRStatus = apps.get_model('seats', 'PNRStatus')
+    last_id = 0
+    while True:
+        batch = list(
+            UserProfile.objects.filter(Q(train_number__isnull=True) | Q(train_number=''), id__gt=last_id)
+            .exclude(current_pnr__isnull=True).exclude(current_pnr='')
+            .order_by('id').only('id', 'current_pnr')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        trains = dict(
+            PNRStatus.objects.filter(pnr_number__in={profile.current_pnr for profile in batch})
+            .exclude(train_number='')
+            .values_list('pnr_number', 'train_number')
+        )
+        updated = []
+        for profile in batch:
+            if profile.current_pnr in trains:
+                profile.train_number = trains[profile.current_pnr]
+                updated.append(profile)
+        UserProfile.objects.bulk_update(updated, ['train_number'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0018_route_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_train_number, migrations.RunPython.noop),
+    ]
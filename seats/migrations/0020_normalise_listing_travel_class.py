@@ -0,0 +1,49 @@
+# Generated by Django 5.1.2 on 2026-10-17 11:40
+
+from django.db import migrations
+
+
+BATCH_SIZE = 1000
+
+
+def _known_travel_class(travel_class):
+    """Same as seats.views.known_travel_class, frozen for this migration"""
+    travel_class = (travel_class or '').strip().upper()
+    return None if travel_class in ('', 'N/A') else travel_class
+
+
+def normalise_travel_class(apps, schema_editor):
+    """
+    Store listing classes the way browse filters on them, a batch of listings at a time
+
+    0012 copied 'N/A' and unnormalised classes from stored PNRs; a listing of
+    unknown class has to be NULL to stay in class-filtered browse.
+    """
+    SeatListing = apps.get_model('seats', 'SeatListing')
+    last_id = 0
+    while True:
+        batch = list(
+            SeatListing.objects.filter(travel_class__isnull=False, id__gt=last_id)
+            .order_by('id').only('id', 'travel_class')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1].id
+        updated = []
+        for listing in batch:
+            travel_class = _known_travel_class(listing.travel_class)
+            if travel_class != listing.travel_class:
+                listing.travel_class = travel_class
+                updated.append(listing)
+        SeatListing.objects.bulk_update(updated, ['travel_class'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0019_backfill_profile_train_number'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalise_travel_class, migrations.RunPython.noop),
+    ]
@@ -3,17 +3,61 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 
 
-class UserProfile(models.Model):
+def route_key(source_code, destination_code, journey_date):
+    """
+    "SRC|DST|YYYY-MM-DD" for a journey, or '' when any part of it is unknown
+    
+    Stored on listings and profiles so that matching a route is one equality
+    on an indexed column instead of three columns compared pairwise.
+    """
+    source_code = (source_code or '').strip().upper()
+    destination_code = (destination_code or '').strip().upper()
+    if not (source_code and destination_code and journey_date):
+        return ''
+    return f'{source_code}|{destination_code}|{journey_date}'
+
+
+class RouteKeyed:
+    """
+    Keeps ``route_key`` in step with the station codes and journey date on every save
+    
+    ``saved_route_key`` is the key the row had in the database before the
+    current save (None for a new row), so post_save handlers can tell when a
+    save moved it to another route.
+    """
+    
+    ROUTE_FIELDS = {'source_station_code', 'destination_station_code', 'journey_date'}
+    saved_route_key = None
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Absent when the column was deferred
+        instance.saved_route_key = instance.__dict__.get('route_key')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        self.route_key = route_key(self.source_station_code, self.destination_station_code, self.journey_date)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.ROUTE_FIELDS.intersection(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'route_key'}
+        super().save(*args, **kwargs)
+        self.saved_route_key = self.route_key
+
+
+class UserProfile(RouteKeyed, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone_number = models.CharField(max_length=15)
     upi_id = models.CharField(max_length=100, blank=True, null=True)
     is_verified = models.BooleanField(default=False)
     current_pnr = models.CharField(max_length=10, blank=True, null=True)  # User's current journey PNR
+    train_number = models.CharField(max_length=10, blank=True, null=True)  # Train of the current journey
     source_station = models.CharField(max_length=100, blank=True, null=True)  # User's journey source
     destination_station = models.CharField(max_length=100, blank=True, null=True)  # User's journey destination
     source_station_code = models.CharField(max_length=10, blank=True, null=True)
     destination_station_code = models.CharField(max_length=10, blank=True, null=True)
     journey_date = models.DateField(blank=True, null=True)
+    route_key = models.CharField(max_length=40, blank=True, default='', editable=False)  # See route_key()
     travel_class = models.CharField(max_length=10, blank=True, null=True)
     pnr_updated_at = models.DateTimeField(blank=True, null=True)  # When PNR was last updated
     created_at = models.DateTimeField(auto_now_add=True)
@@ -22,7 +66,7 @@ class UserProfile(models.Model):
         return f"{self.user.username} - {self.phone_number}"
 
 
-class SeatListing(models.Model):
+class SeatListing(RouteKeyed, models.Model):
     SEAT_TYPES = [
         ('LOWER', 'Lower'),
         ('MIDDLE', 'Middle'),
@@ -36,6 +80,7 @@ class SeatListing(models.Model):
         ('BOOKED', 'Booked'),
         ('COMPLETED', 'Completed'),
         ('CANCELLED', 'Cancelled'),
+        ('EXPIRED', 'Expired'),  # Journey date passed while still available
     ]
     
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='seat_listings')
@@ -47,9 +92,14 @@ class SeatListing(models.Model):
     source_station_code = models.CharField(max_length=10)
     destination_station_code = models.CharField(max_length=10)
     journey_date = models.DateField()
+    route_key = models.CharField(max_length=40, blank=True, default='', editable=False)  # See route_key()
     seat_type = models.CharField(max_length=20, choices=SEAT_TYPES)
     seat_number = models.CharField(max_length=10)
     coach_number = models.CharField(max_length=10)
+    travel_class = models.CharField(max_length=10, blank=True, null=True)  # From the PNR, e.g. 3A, SL
+    # Stop numbers of source and destination on the train's route (see seats.schedules); null when unknown
+    source_stop = models.PositiveSmallIntegerField(blank=True, null=True)
+    destination_stop = models.PositiveSmallIntegerField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='AVAILABLE')
@@ -58,6 +108,26 @@ class SeatListing(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Serves browse_seats: one route_key equality on available listings, already in
+            # keyset (created_at, id) order so pages need no sort
+            models.Index(fields=['status', 'route_key', 'created_at', 'id'], name='seats_listing_route_idx'),
+            # Serves browse's cheapest-first order on the same route lookup
+            models.Index(fields=['status', 'route_key', 'price', 'id'], name='seats_listing_route_price_idx'),
+            # Serves browse's train and class filters, and through its (train_number,
+            # journey_date) prefix the ticket-checker console's train/date filters
+            models.Index(fields=['train_number', 'journey_date', 'travel_class', 'status'],
+                         name='seats_listing_class_idx'),
+            # Serves segment matching: available listings on a train and date whose stretch
+            # starts at or before the buyer's boarding stop, range-scanned on source_stop
+            models.Index(
+                fields=['status', 'train_number', 'journey_date', 'source_stop', 'destination_stop'],
+                name='seats_listing_segment_idx',
+            ),
+            # Serves retention: past listings to expire (status=AVAILABLE) or archive (every
+            # status), oldest journey first
+            models.Index(fields=['status', 'journey_date'], name='seats_listing_journey_idx'),
+        ]
     
     def __str__(self):
         return f"{self.train_name} - {self.seat_type} - {self.seat_number}"
@@ -80,9 +150,17 @@ class SeatExchange(models.Model):
     buyer_pnr = models.CharField(max_length=10)
     exchange_date = models.DateTimeField(auto_now_add=True)
     completion_date = models.DateTimeField(blank=True, null=True)
+    # A PENDING exchange holds its seat until then (see seats.holds)
+    hold_expires_at = models.DateTimeField(blank=True, null=True)
     
     class Meta:
         ordering = ['-exchange_date']
+        indexes = [
+            # Serves admin_exchanges: PAID exchanges, newest first
+            models.Index(fields=['payment_status', 'exchange_date'], name='seats_exchange_status_idx'),
+            # Serves the hold sweeper: expired PENDING exchanges, oldest first
+            models.Index(fields=['payment_status', 'hold_expires_at'], name='seats_exchange_hold_idx'),
+        ]
     
     def __str__(self):
         return f"Exchange: {self.seller.username} -> {self.buyer.username}"
@@ -99,8 +177,15 @@ class PNRStatus(models.Model):
     journey_date = models.DateField()
     passenger_count = models.IntegerField()
     travel_class = models.CharField(max_length=10, blank=True, null=True)  # Added travel class field
+    chart_prepared = models.BooleanField(default=False)  # Berths are final once the chart is prepared
     last_updated = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Serves retention: snapshots of past journeys to archive
+            models.Index(fields=['journey_date'], name='seats_pnr_journey_idx'),
+        ]
+    
     def __str__(self):
         return f"PNR: {self.pnr_number} - {self.train_name}"
 
@@ -122,6 +207,11 @@ class PassengerDetails(models.Model):
     
     class Meta:
         ordering = ['passenger_serial_number']
+        constraints = [
+            # Refreshes match stored passengers to API data on this key
+            models.UniqueConstraint(fields=['pnr_status', 'passenger_serial_number'],
+                                    name='seats_passenger_serial_uniq'),
+        ]
 
 
 class StationCode(models.Model):
@@ -131,3 +221,123 @@ class StationCode(models.Model):
     
     def __str__(self):
         return f"{self.station_code} - {self.station_name}"
+
+
+class SeatRequest(models.Model):
+    """A buyer's standing "wanted seat" on a train; blank criteria match anything"""
+    
+    STATUS_CHOICES = [
+        ('OPEN', 'Open'),
+        ('FULFILLED', 'Fulfilled'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+    
+    requester = models.ForeignKey(User, on_delete=models.CASCADE, related_name='seat_requests')
+    train_number = models.CharField(max_length=10)
+    journey_date = models.DateField()
+    travel_class = models.CharField(max_length=10, blank=True, default='')
+    seat_type = models.CharField(max_length=20, choices=SeatListing.SEAT_TYPES, blank=True, default='')
+    coach_prefix = models.CharField(max_length=10, blank=True, default='')  # e.g. "B" for B-coaches
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='OPEN')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # One bucket of open requests per (train, date, class, berth type): a new
+            # listing probes only the buckets it can satisfy (see seats.matching)
+            models.Index(fields=['status', 'train_number', 'journey_date', 'travel_class', 'seat_type'],
+                         name='seats_request_bucket_idx'),
+            # Serves retention: requests for past journeys to archive
+            models.Index(fields=['journey_date'], name='seats_request_journey_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.requester.username} wants {self.seat_type or 'any berth'} on {self.train_number}"
+
+
+class SeatMatch(models.Model):
+    seat_request = models.ForeignKey(SeatRequest, on_delete=models.CASCADE, related_name='matches')
+    listing = models.ForeignKey(SeatListing, on_delete=models.CASCADE, related_name='request_matches')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['seat_request', 'listing'], name='seats_match_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"Match: {self.seat_request_id} <- {self.listing_id}"
+
+
+class SwapGroup(models.Model):
+    """A proposed cycle of berth swaps between travellers on one train (see seats.swaps)"""
+    
+    STATUS_CHOICES = [
+        ('PROPOSED', 'Proposed'),
+        ('ACCEPTED', 'Accepted'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+    
+    train_number = models.CharField(max_length=10)
+    journey_date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PROPOSED')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['train_number', 'journey_date', 'status'], name='seats_swapgroup_train_idx'),
+            # Serves retention: proposals for past journeys to archive
+            models.Index(fields=['journey_date'], name='seats_swapgroup_journey_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Swap group {self.id} on {self.train_number}"
+
+
+class SwapMove(models.Model):
+    """One traveller's part in a SwapGroup: the berth they hand over and the one they take"""
+    group = models.ForeignKey(SwapGroup, on_delete=models.CASCADE, related_name='moves')
+    traveller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='swap_moves')
+    seat_request = models.ForeignKey(SeatRequest, on_delete=models.CASCADE, related_name='swap_moves')
+    gives = models.ForeignKey(PassengerDetails, on_delete=models.CASCADE, related_name='+')
+    receives = models.ForeignKey(PassengerDetails, on_delete=models.CASCADE, related_name='+')
+    
+    def __str__(self):
+        return f"{self.traveller.username}: {self.gives_id} -> {self.receives_id}"
+
+
+class Train(models.Model):
+    train_number = models.CharField(max_length=10, unique=True)
+    train_name = models.CharField(max_length=100, blank=True)
+    fetched_at = models.DateTimeField()  # When the stop list was last taken from the API
+    
+    def __str__(self):
+        return f"{self.train_number} {self.train_name}".strip()
+
+
+class TrainStop(models.Model):
+    train = models.ForeignKey(Train, on_delete=models.CASCADE, related_name='stops')
+    sequence = models.PositiveIntegerField()  # 0 at the origin, increasing along the route
+    station_code = models.CharField(max_length=10)
+    station_name = models.CharField(max_length=100, blank=True)
+    arrival_time = models.CharField(max_length=5, blank=True)  # HH:MM as published
+    departure_time = models.CharField(max_length=5, blank=True)
+    distance = models.IntegerField(default=0)  # km from the origin
+    day = models.PositiveSmallIntegerField(default=1)  # Day of the run, 1 at the origin
+    
+    def __str__(self):
+        return f"{self.train.train_number} #{self.sequence} {self.station_code}"
+    
+    class Meta:
+        ordering = ['train', 'sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['train', 'sequence'], name='seats_trainstop_seq_uniq'),
+        ]
+        indexes = [
+            # Which trains call at a station
+            models.Index(fields=['station_code', 'train'], name='seats_trainstop_station_idx'),
+        ]
@@ -0,0 +1,160 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET, each page remembers the ordering values of its last row and
+the next page starts strictly after them, so every page costs the same no
+matter how deep the user scrolls.
+"""
+
+import base64
+import json
+from operator import attrgetter
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class KeysetPage:
+    """One page of results plus the cursor for the page after it"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def encode_cursor(values):
+    """Pack ordering values into an opaque, URL-safe cursor"""
+    payload = json.dumps([str(value) for value in values])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, model, fields):
+    """Unpack a cursor into Python values for ``fields``; None if it is invalid"""
+    if not cursor:
+        return None
+    try:
+        raw_values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        if len(raw_values) != len(fields):
+            return None
+        return [model._meta.get_field(name).to_python(value) for name, value in zip(fields, raw_values)]
+    except Exception:
+        return None
+
+
+def _split_ordering(ordering):
+    """Return (field names, descending) for an ordering like ('-created_at', '-id')"""
+    descending = {field.startswith('-') for field in ordering}
+    if len(descending) != 1:
+        raise ValueError('Keyset ordering fields must all sort in the same direction')
+    return [field.lstrip('-') for field in ordering], descending.pop()
+
+
+def _after(fields, values, descending):
+    """Build the "strictly after this row" condition for a composite key"""
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for position, name in enumerate(fields):
+        step = Q(**{f'{name}__{lookup}': values[position]})
+        for previous, previous_value in zip(fields[:position], values[:position]):
+            step &= Q(**{previous: previous_value})
+        condition |= step
+    # Redundant bound on the leading field lets the database seek instead of scan
+    bound = Q(**{f"{fields[0]}__{lookup}e": values[0]})
+    return bound & condition
+
+
+def keyset_paginate(queryset, cursor=None, page_size=20, ordering=('-created_at', '-id')):
+    """
+    Return a KeysetPage of ``queryset`` ordered by ``ordering``
+
+    Args:
+        queryset: Filtered queryset to page through
+        cursor (str): Cursor from a previous page, or None for the first page
+        page_size (int): Rows per page
+        ordering (tuple): Unique ordering, ending with the primary key as a tie-breaker
+
+    Returns:
+        KeysetPage: Rows for this page and the cursor of the next one
+    """
+    fields, descending = _split_ordering(ordering)
+    queryset = queryset.order_by(*ordering)
+
+    values = decode_cursor(cursor, queryset.model, fields)
+    if values is not None:
+        queryset = queryset.filter(_after(fields, values, descending))
+
+    # Fetch one extra row to learn whether another page exists
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, name) for name in fields])
+
+    return KeysetPage(rows, next_cursor)
+
+
+def keyset_paginate_rows(rows, model, cursor=None, page_size=20, ordering=('-created_at', '-id')):
+    """
+    ``keyset_paginate`` over rows already in memory, with the same cursors
+
+    Args:
+        rows (iterable): Objects with an attribute per ordering field
+        model: Model whose fields decode the cursor
+        cursor (str): Cursor from a previous page (of either kind), or None
+        page_size (int): Rows per page
+        ordering (tuple): Unique ordering, ending with the primary key as a tie-breaker
+
+    Returns:
+        KeysetPage: Rows for this page and the cursor of the next one
+    """
+    fields, descending = _split_ordering(ordering)
+    key = attrgetter(*fields) if len(fields) > 1 else (lambda row: (getattr(row, fields[0]),))
+    rows = sorted(rows, key=key, reverse=descending)
+
+    values = decode_cursor(cursor, model, fields)
+    if values is not None:
+        values = tuple(values)
+        rows = [row for row in rows if (key(row) < values if descending else key(row) > values)]
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(key(rows[-1]))
+    return KeysetPage(rows, next_cursor)
+
+
+def get_page_size(request, default_size):
+    """Page size from ?page_size=, clamped to SEATSWAP_MAX_PAGE_SIZE"""
+    max_size = getattr(settings, 'SEATSWAP_MAX_PAGE_SIZE', 100)
+    try:
+        page_size = int(request.GET.get('page_size', default_size))
+    except (TypeError, ValueError):
+        page_size = default_size
+    return max(1, min(page_size, max_size))
+
+
+def get_page_queries(request, page):
+    """Query strings for the first page and the next page (None on the last page)"""
+    params = request.GET.copy()
+    params.pop('format', None)
+    params.pop('cursor', None)
+    first_page_query = params.urlencode()
+    next_page_query = None
+    if page.has_next:
+        params['cursor'] = page.next_cursor
+        next_page_query = params.urlencode()
+    return first_page_query, next_page_query
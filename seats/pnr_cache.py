@@ -0,0 +1,250 @@
+"""
+Two-tier cache for processed PNR data.
+
+Tier 1 is an in-process LRU with size and TTL eviction. Tier 2 is Django's cache
+framework, so any configured backend (locmem, file, database) works without
+outside services. The PNRStatus table stays the durable fallback behind both.
+
+How long an entry stays fresh depends on the journey (see ``pnr_freshness``):
+charted and far-off confirmed tickets change rarely, waitlisted tickets and
+tickets close to departure change often, and past journeys never change.
+
+Tier 2 stores each entry with its expiry time, so a tier 2 hit promoted to
+tier 1 keeps only what is left of its freshness window, never a new one.
+
+Invalidation clears tier 2 for every process but tier 1 only in the process
+that stored the row. Other worker processes may keep serving their own copy
+until it expires, so cross-process staleness is bounded by
+SEATSWAP_PNR_LRU_TTL (300 seconds by default); lower it if that is too long.
+
+Cached dicts are shared between callers and must be treated as read-only.
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+# Freshness window in seconds per policy, overridable with SEATSWAP_PNR_TTL
+DEFAULT_PNR_TTL = {
+    'past': 30 * 86400,           # Journey is over: never refetch
+    'charted': 12 * 3600,         # Chart prepared: berths are final
+    'waitlisted': 15 * 60,        # WL/RAC: status moves as cancellations come in
+    'near_departure': 30 * 60,    # Chart is due soon: berths may still change
+    'confirmed': 6 * 3600,        # Confirmed, journey within the week
+    'far_off': 3 * 86400,         # Confirmed, journey weeks away
+}
+
+WAITLIST_MARKERS = ('WL', 'RAC', 'RQWL', 'PQWL', 'RLWL', 'GNWL', 'TQWL')
+
+
+def get_pnr_ttls():
+    return {**DEFAULT_PNR_TTL, **getattr(settings, 'SEATSWAP_PNR_TTL', {})}
+
+
+def _is_waitlisted(pnr_data):
+    for passenger in pnr_data.get('passengers', []):
+        status = (passenger.get('current_status') or passenger.get('booking_status') or '').upper()
+        if status.startswith(WAITLIST_MARKERS):
+            return True
+    return False
+
+
+def pnr_freshness(pnr_data, today=None):
+    """
+    Pick the freshness policy for processed PNR data
+
+    Args:
+        pnr_data (dict): Processed PNR data (journey_date, chart_prepared, passengers)
+        today (date): Override for the current date
+
+    Returns:
+        tuple: (policy name, freshness window in seconds)
+    """
+    ttls = get_pnr_ttls()
+    today = today or timezone.localdate()
+
+    journey_date = pnr_data.get('journey_date')
+    if isinstance(journey_date, str):
+        journey_date = parse_date(journey_date)
+    days_to_journey = (journey_date - today).days if isinstance(journey_date, date) else 0
+
+    if days_to_journey < 0:
+        policy = 'past'
+    elif pnr_data.get('chart_prepared'):
+        policy = 'charted'
+    elif _is_waitlisted(pnr_data):
+        policy = 'waitlisted'
+    elif days_to_journey <= getattr(settings, 'SEATSWAP_PNR_NEAR_DEPARTURE_DAYS', 1):
+        policy = 'near_departure'
+    elif days_to_journey > getattr(settings, 'SEATSWAP_PNR_FAR_OFF_DAYS', 7):
+        policy = 'far_off'
+    else:
+        policy = 'confirmed'
+    return policy, ttls[policy]
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with per-entry expiry"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting the least recently used entry when full"""
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PNRCache:
+    """
+    In-process LRU in front of a Django cache alias, keyed by PNR number
+
+    Settings:
+        SEATSWAP_PNR_LRU_SIZE: Entries kept per process (default 1024)
+        SEATSWAP_PNR_LRU_TTL: Seconds an entry lives in the process (default 300)
+        SEATSWAP_PNR_CACHE_ALIAS: Django cache alias for tier 2 (default 'default')
+        SEATSWAP_PNR_CACHE_TTL: Tier 2 lifetime when no timeout is given (default 86400)
+    """
+
+    key_prefix = 'pnr:'
+
+    def __init__(self):
+        self.memory = LRUCache(
+            maxsize=getattr(settings, 'SEATSWAP_PNR_LRU_SIZE', 1024),
+            ttl=getattr(settings, 'SEATSWAP_PNR_LRU_TTL', 300),
+        )
+        self.counters = Counter()
+        self.policy_counters = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[getattr(settings, 'SEATSWAP_PNR_CACHE_ALIAS', 'default')]
+
+    def _key(self, pnr_number):
+        return f'{self.key_prefix}{pnr_number}'
+
+    def record(self, event, count=1):
+        """Increment a hit/miss counter"""
+        with self._lock:
+            self.counters[event] += count
+
+    def record_policy(self, policy, hit):
+        """Count a fresh hit, or a refetch, for a freshness policy"""
+        with self._lock:
+            self.policy_counters[(policy, 'hits' if hit else 'misses')] += 1
+
+    def get(self, pnr_number):
+        """Return cached PNR data from the fastest tier that has it, or None"""
+        pnr_data = self.memory.get(pnr_number)
+        if pnr_data is not None:
+            self.record('memory_hits')
+            return pnr_data
+
+        entry = self.shared.get(self._key(pnr_number))
+        if entry is not None:
+            pnr_data, expires_at = entry
+            remaining = expires_at - time.time()
+            if remaining > 0:
+                self.record('cache_hits')
+                self.memory.set(pnr_number, pnr_data, ttl=min(remaining, self.memory.ttl))
+                return pnr_data
+
+        self.record('misses')
+        return None
+
+    def set(self, pnr_number, pnr_data, timeout=None):
+        """Store PNR data in both tiers for at most ``timeout`` seconds"""
+        if timeout is None:
+            timeout = getattr(settings, 'SEATSWAP_PNR_CACHE_TTL', 86400)
+        if timeout <= 0:
+            return
+        self.memory.set(pnr_number, pnr_data, ttl=min(timeout, self.memory.ttl))
+        # Wall-clock expiry, as other processes read it
+        self.shared.set(self._key(pnr_number), (pnr_data, time.time() + timeout), timeout=timeout)
+
+    def invalidate(self, pnr_number):
+        """Drop a PNR from both tiers after its database row changed"""
+        self.memory.delete(pnr_number)
+        self.shared.delete(self._key(pnr_number))
+        self.record('invalidations')
+
+    def clear(self):
+        """Empty the in-process tier and reset counters"""
+        self.memory.clear()
+        with self._lock:
+            self.counters.clear()
+            self.policy_counters.clear()
+
+    def stats(self):
+        """Counters for this process plus derived hit ratio"""
+        with self._lock:
+            counters = dict(self.counters)
+            policy_counters = dict(self.policy_counters)
+        hits = counters.get('memory_hits', 0) + counters.get('cache_hits', 0)
+        lookups = hits + counters.get('misses', 0)
+
+        policies = {}
+        for policy in sorted({policy for policy, _ in policy_counters}):
+            policy_hits = policy_counters.get((policy, 'hits'), 0)
+            policy_misses = policy_counters.get((policy, 'misses'), 0)
+            policies[policy] = {
+                'hits': policy_hits,
+                'misses': policy_misses,
+                'hit_ratio': round(policy_hits / (policy_hits + policy_misses), 4),
+            }
+
+        return {
+            'memory_hits': counters.get('memory_hits', 0),
+            'cache_hits': counters.get('cache_hits', 0),
+            'misses': counters.get('misses', 0),
+            'db_hits': counters.get('db_hits', 0),
+            'api_calls': counters.get('api_calls', 0),
+            'invalidations': counters.get('invalidations', 0),
+            'hit_ratio': round(hits / lookups, 4) if lookups else None,
+            'memory_entries': len(self.memory),
+            'policies': policies,
+        }
+
+
+pnr_cache = PNRCache()
@@ -0,0 +1,161 @@
+"""
+Journey-date lifecycle of listings, requests and PNR snapshots.
+
+Once its journey date has passed, an AVAILABLE listing can never be used, so
+``expire_past_listings`` marks it EXPIRED and browse stops seeing it. Rows
+for journeys older than the retention window (SEATSWAP_RETENTION_DAYS) then
+leave the hot tables: ``archive_past_journeys`` writes them to a gzipped JSON
+Lines file in Django's serialization format, so ``manage.py loaddata
+<file>`` puts them back, and deletes them.
+
+Both work in chunks of ids picked through a journey_date index, each chunk in
+its own short transaction, so neither holds a table lock for longer than one
+chunk takes and either can stop and resume at any point. A chunk is written
+to the archive before its rows are deleted; if the delete fails, the next run
+archives those rows again, so an archive may hold a row twice but never
+loses one.
+"""
+
+import gzip
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core import serializers
+from django.db import transaction
+from django.utils import timezone
+
+from .browse_cache import browse_cache
+from .models import (
+    PassengerDetails, PNRStatus, SeatExchange, SeatListing, SeatMatch, SeatRequest, SwapGroup, SwapMove,
+)
+
+
+# Rows archived by journey date, each with the rows that reference it. Parents
+# are written first so loaddata can restore a chunk, and deleted last. Swap
+# groups go before the requests and PNRs their moves point at.
+ARCHIVED = [
+    (SwapGroup, [(SwapMove, 'group')]),
+    (SeatRequest, [(SeatMatch, 'seat_request'), (SwapMove, 'seat_request')]),
+    (SeatListing, [(SeatExchange, 'seat_listing'), (SeatMatch, 'listing')]),
+    (PNRStatus, [(PassengerDetails, 'pnr_status')]),
+]
+
+
+def retention_cutoff(today=None):
+    """First journey date kept in the hot tables"""
+    today = today or timezone.localdate()
+    return today - timedelta(days=getattr(settings, 'SEATSWAP_RETENTION_DAYS', 30))
+
+
+def expire_past_listings(today=None, batch_size=1000, report=None):
+    """
+    Mark AVAILABLE listings whose journey date has passed as EXPIRED
+
+    Args:
+        today (date): Listings for journeys before it expire
+        batch_size (int): Listings updated per statement
+        report (callable): Called with (label, rows, seconds) after each batch
+
+    Returns:
+        int: Listings expired
+    """
+    today = today or timezone.localdate()
+    expired = 0
+    while True:
+        started = time.perf_counter()
+        batch = dict(
+            SeatListing.objects.filter(journey_date__lt=today, status='AVAILABLE')
+            .order_by('journey_date', 'id').values_list('id', 'route_key')[:batch_size]
+        )
+        if not batch:
+            return expired
+        # Still AVAILABLE, so a seat booked since the SELECT is left alone
+        with transaction.atomic():
+            count = SeatListing.objects.filter(id__in=batch, status='AVAILABLE').update(
+                status='EXPIRED', updated_at=timezone.now(),
+            )
+            browse_cache.bump_on_commit(batch.values())
+        expired += count
+        if report:
+            report('expired listings', count, time.perf_counter() - started)
+        if len(batch) < batch_size:
+            return expired
+
+
+def archive_path(archive_dir=None):
+    """New archive file for this run, under SEATSWAP_ARCHIVE_DIR"""
+    archive_dir = Path(archive_dir or getattr(settings, 'SEATSWAP_ARCHIVE_DIR', None)
+                       or settings.BASE_DIR / 'archive')
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    return archive_dir / f"seatswap-{timezone.now():%Y%m%d-%H%M%S}.jsonl.gz"
+
+
+def open_archive(path):
+    """Gzipped text stream for an archive file"""
+    return gzip.open(path, 'wt', encoding='utf-8')
+
+
+def past_journeys(model, cutoff):
+    """``model`` rows for journeys before ``cutoff``, through the model's journey_date index"""
+    rows = model.objects.filter(journey_date__lt=cutoff)
+    if model is SeatListing:
+        # seats_listing_journey_idx leads with status: naming every status makes the
+        # lookup one index range per status instead of a table scan
+        rows = rows.filter(status__in=[status for status, _ in SeatListing.STATUS_CHOICES])
+    return rows
+
+
+def _archive_chunk(model, children, ids, stream):
+    """Write a chunk of ``model`` rows and the rows referencing them, then delete them all; rows moved"""
+    parents = list(model.objects.filter(id__in=ids).order_by())
+    related = [
+        (child, list(child.objects.filter(**{f'{field}__in': ids}).order_by()))
+        for child, field in children
+    ]
+    serializers.serialize('jsonl', parents, stream=stream)
+    for _, rows in related:
+        serializers.serialize('jsonl', rows, stream=stream)
+    stream.flush()
+
+    moved = len(parents)
+    for child, rows in related:
+        child.objects.filter(id__in=[row.id for row in rows]).delete()
+        moved += len(rows)
+    model.objects.filter(id__in=ids).delete()
+    return moved
+
+
+def archive_past_journeys(stream, cutoff=None, chunk_size=500, report=None):
+    """
+    Move rows for journeys before ``cutoff`` from the hot tables to ``stream``
+
+    Args:
+        stream: Text stream the archive is written to, one JSON object per row
+        cutoff (date): First journey date kept; defaults to ``retention_cutoff()``
+        chunk_size (int): Parent rows moved per transaction
+        report (callable): Called with (label, rows, seconds) after each chunk
+
+    Returns:
+        dict: Model label -> rows moved, children included
+    """
+    cutoff = cutoff or retention_cutoff()
+    moved = {}
+    for model, children in ARCHIVED:
+        label = model._meta.label
+        moved[label] = 0
+        while True:
+            started = time.perf_counter()
+            # Unordered, so the index walk stops at the chunk size instead of sorting every past row
+            ids = list(past_journeys(model, cutoff).order_by().values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                rows = _archive_chunk(model, children, ids, stream)
+            moved[label] += rows
+            if report:
+                report(label, rows, time.perf_counter() - started)
+            if len(ids) < chunk_size:
+                break
+    return moved
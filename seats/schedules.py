@@ -0,0 +1,217 @@
+"""
+Train schedules kept as a local asset.
+
+``get_train_schedule`` reads through three tiers before paying for an API
+call: an in-process LRU of ready ``TrainSchedule`` objects, Django's cache, and
+the Train/TrainStop tables. A schedule fetched from the API is written to the
+tables in one bulk insert per train and cached for SEATSWAP_SCHEDULE_TTL
+seconds (a week by default); timetables change a few times a year, so rows
+older than that are refetched, and kept if the API has nothing better. A
+lookup the API could not answer (unknown train, error or timeout) is cached
+too, as an empty or outdated schedule, for SEATSWAP_SCHEDULE_MISS_TTL seconds,
+so it is not paid for again on every browse or listing.
+
+A ``TrainSchedule`` maps each station code to its stop number, so "does this
+train call at X before Y, and at which stops?" is two dict lookups. Listings
+store the stop numbers of their source and destination, which turns "which
+seats cover my journey?" into one range query (``covers_segment``).
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from railway_api import get_railway_api_client
+from .models import Train, TrainStop
+from .pnr_cache import LRUCache
+
+
+KEY_PREFIX = 'schedule:'
+STOP_FIELDS = ('station_code', 'station_name', 'arrival_time', 'departure_time', 'distance', 'day')
+
+# Accepted keys for each stop field in API responses, first match wins
+STOP_KEYS = {
+    'station_code': ('station_code', 'stationCode'),
+    'station_name': ('station_name', 'stationName'),
+    'arrival_time': ('arrival_time', 'arrivalTime'),
+    'departure_time': ('departure_time', 'departureTime'),
+    'distance': ('distance', 'distance_from_source'),
+    'day': ('day', 'dayCount'),
+}
+
+
+class TrainSchedule:
+    """A train's ordered stops with an O(1) station code -> stop number index"""
+
+    def __init__(self, train_number, stops):
+        self.train_number = train_number
+        self.stops = list(stops)
+        self.positions = {}
+        for position, stop in enumerate(self.stops):
+            # A route that loops back through a station keeps its first call
+            self.positions.setdefault(stop['station_code'], position)
+
+    def position(self, station_code):
+        """Stop number of ``station_code`` on this route, or None if the train does not call there"""
+        return self.positions.get((station_code or '').strip().upper())
+
+    def segment(self, source_code, destination_code):
+        """
+        Stop numbers for a journey from ``source_code`` to ``destination_code``
+
+        Returns:
+            tuple: (source stop, destination stop), or None unless the train
+            calls at both and reaches the source first
+        """
+        source, destination = self.position(source_code), self.position(destination_code)
+        if source is None or destination is None or source >= destination:
+            return None
+        return source, destination
+
+    def __contains__(self, station_code):
+        return self.position(station_code) is not None
+
+    def __len__(self):
+        return len(self.stops)
+
+    def __bool__(self):
+        return bool(self.stops)
+
+
+# Bounded in time too, so a schedule stored by another process reaches this one within the hour
+_schedules = LRUCache(maxsize=getattr(settings, 'SEATSWAP_SCHEDULE_LRU_SIZE', 256), ttl=3600)
+
+
+def _ttl():
+    return getattr(settings, 'SEATSWAP_SCHEDULE_TTL', 7 * 86400)
+
+
+def _miss_ttl():
+    return getattr(settings, 'SEATSWAP_SCHEDULE_MISS_TTL', 3600)
+
+
+def _first(record, keys, default=''):
+    for key in keys:
+        value = record.get(key)
+        if value not in (None, ''):
+            return value
+    return default
+
+
+def _int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def normalise_stops(api_stops):
+    """Turn a raw trainSchedule stop list into stop dicts with STOP_FIELDS, dropping stops without a code"""
+    if isinstance(api_stops, dict):
+        api_stops = api_stops.get('route') or api_stops.get('stations') or []
+    stops = []
+    for record in api_stops or []:
+        if not isinstance(record, dict):
+            continue
+        code = str(_first(record, STOP_KEYS['station_code'])).strip().upper()
+        if not code:
+            continue
+        stops.append({
+            'station_code': code,
+            'station_name': str(_first(record, STOP_KEYS['station_name'])).strip(),
+            'arrival_time': str(_first(record, STOP_KEYS['arrival_time']))[:5],
+            'departure_time': str(_first(record, STOP_KEYS['departure_time']))[:5],
+            'distance': _int(_first(record, STOP_KEYS['distance'], 0), 0),
+            'day': _int(_first(record, STOP_KEYS['day'], 1), 1),
+        })
+    return stops
+
+
+def store_train_schedule(train_number, stops, train_name=''):
+    """Replace a train's stored stops with ``stops`` in one bulk insert and cache the result"""
+    with transaction.atomic():
+        defaults = {'fetched_at': timezone.now()}
+        if train_name:
+            defaults['train_name'] = train_name
+        train, _ = Train.objects.update_or_create(train_number=train_number, defaults=defaults)
+        train.stops.all().delete()
+        TrainStop.objects.bulk_create([
+            TrainStop(train=train, sequence=sequence, **stop) for sequence, stop in enumerate(stops)
+        ])
+    return _cache_schedule(train_number, stops)
+
+
+def load_stored_schedule(train_number):
+    """(stops, fresh) from the tables, or (None, False) if the train was never stored"""
+    train = Train.objects.filter(train_number=train_number).first()
+    if train is None:
+        return None, False
+    stops = list(train.stops.order_by('sequence').values(*STOP_FIELDS))
+    return stops, train.fetched_at >= timezone.now() - timedelta(seconds=_ttl())
+
+
+def _cache_schedule(train_number, stops, ttl=None):
+    schedule = TrainSchedule(train_number, stops)
+    ttl = _ttl() if ttl is None else ttl
+    _schedules.set(train_number, schedule, min(ttl, _schedules.ttl))
+    cache.set(f'{KEY_PREFIX}{train_number}', stops, ttl)
+    return schedule
+
+
+def get_train_schedule(train_number):
+    """
+    A train's schedule, from the fastest tier that has a fresh copy
+
+    Args:
+        train_number (str): Train number (e.g., '12185')
+
+    Returns:
+        TrainSchedule: Possibly empty if neither the tables nor the API know the train
+    """
+    train_number = (train_number or '').strip()
+    if not train_number:
+        return TrainSchedule(train_number, [])
+
+    schedule = _schedules.get(train_number)
+    if schedule is not None:
+        return schedule
+
+    stops = cache.get(f'{KEY_PREFIX}{train_number}')
+    if stops is not None:
+        schedule = TrainSchedule(train_number, stops)
+        _schedules.set(train_number, schedule)
+        return schedule
+
+    stored, fresh = load_stored_schedule(train_number)
+    if fresh:
+        return _cache_schedule(train_number, stored)
+
+    stops = normalise_stops(get_railway_api_client().get_train_schedule(train_number))
+    if stops:
+        return store_train_schedule(train_number, stops)
+    # API failed or does not know the train: an outdated timetable beats none, and
+    # either is remembered for a while so the next lookup does not ask again
+    return _cache_schedule(train_number, stored or [], _miss_ttl())
+
+
+def assign_listing_stops(listing):
+    """Set a listing's source_stop/destination_stop from its train's route; False if the route is unknown"""
+    segment = get_train_schedule(listing.train_number).segment(
+        listing.source_station_code, listing.destination_station_code)
+    listing.source_stop, listing.destination_stop = segment or (None, None)
+    return segment is not None
+
+
+def covers_segment(segment):
+    """Q for listings whose stretch of the route contains ``segment`` (source stop, destination stop)"""
+    source, destination = segment
+    return Q(source_stop__lte=source, destination_stop__gte=destination)
+
+
+def clear_schedule_cache():
+    """Forget every schedule held in this process"""
+    _schedules.clear()
@@ -0,0 +1,42 @@
+"""
+Model signal handlers that keep in-process indexes and caches in step with the database,
+and match new listings and seat requests against each other.
+
+Queryset ``update()`` calls send no signals; code that changes listings that
+way bumps the browse cache itself (``browse_cache.bump_on_commit``).
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .browse_cache import browse_cache
+from .matching import match_listings, match_request
+from .models import SeatListing, SeatRequest, StationCode
+from .stations import bump_station_version
+
+
+@receiver([post_save, post_delete], sender=StationCode)
+def station_changed(sender, **kwargs):
+    # After commit, so a process that rebuilds on the new version sees the change
+    transaction.on_commit(bump_station_version)
+
+
+@receiver(post_save, sender=SeatListing)
+def listing_saved(sender, instance, **kwargs):
+    # After commit, so a rolled back listing never leaves matches behind
+    if instance.status == 'AVAILABLE':
+        transaction.on_commit(lambda: match_listings([instance]))
+
+
+@receiver([post_save, post_delete], sender=SeatListing)
+def listing_changed(sender, instance, **kwargs):
+    # Status, price or the listing itself may have changed what its route shows; an edit
+    # that moved it to another route also changes what the old one shows
+    browse_cache.bump_on_commit([instance.route_key, instance.saved_route_key])
+
+
+@receiver(post_save, sender=SeatRequest)
+def seat_request_saved(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: match_request(instance))
@@ -0,0 +1,192 @@
+"""
+Request coalescing for slow upstream calls.
+
+``SingleFlight`` makes concurrent callers in one process share a single call
+per key. ``file_lock`` extends that across worker processes on the same host:
+the process holding the lock does the call while the others wait, then find
+the result already stored. ``lock_bucket`` maps keys onto a fixed set of lock
+names so the number of lock files stays bounded. ``AsyncSingleFlight`` and
+``afile_lock`` are the same tools for async views; they wait without blocking
+the event loop.
+
+``AsyncSingleFlight`` shares calls within one event loop, which under ASGI is
+every request of the worker. Under WSGI each async view runs on its own
+loop, so it coalesces nothing across requests and ``afile_lock`` alone keeps
+concurrent requests to one upstream fetch.
+"""
+
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import asynccontextmanager, contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process coalescing only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers get its result"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """
+        Call ``func`` unless a call for ``key`` is already running, then share its outcome
+
+        Returns:
+            The value returned by the (possibly shared) call. Exceptions raised
+            by the call are re-raised in every waiting caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        """Number of keys currently being fetched"""
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines: concurrent awaits of one key share one call"""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func):
+        """
+        Await ``func()`` unless a call for ``key`` is already running, then share its outcome
+
+        Calls are shared within one event loop; a loop never awaits another
+        loop's future.
+        """
+        flight = (asyncio.get_running_loop(), key)
+        call = self._calls.get(flight)
+        if call is not None:
+            return await asyncio.shield(call)
+
+        call = self._calls[flight] = asyncio.ensure_future(func())
+        try:
+            return await asyncio.shield(call)
+        finally:
+            if call.done():
+                del self._calls[flight]
+            else:
+                # The leader was cancelled; let the call finish for the others
+                call.add_done_callback(lambda _: self._calls.pop(flight, None))
+
+    def in_flight(self):
+        """Number of keys currently being fetched"""
+        return len(self._calls)
+
+
+def lock_bucket(prefix, key, buckets=64):
+    """
+    Name of the lock file ``key`` hashes into, one of ``buckets`` per prefix
+
+    Uses crc32 rather than ``hash()`` so every process picks the same bucket.
+    Unrelated keys may share a bucket and then wait on each other briefly.
+    """
+    return f'{prefix}-{zlib.crc32(str(key).encode("utf-8")) % buckets}'
+
+
+def _open_lock_file(name, lock_dir):
+    lock_dir = lock_dir or os.path.join(tempfile.gettempdir(), 'seatswap-locks')
+    os.makedirs(lock_dir, exist_ok=True)
+    return open(os.path.join(lock_dir, f'{name}.lock'), 'a+')
+
+
+def _try_lock(handle):
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+@contextmanager
+def file_lock(name, lock_dir=None, timeout=15.0, poll_interval=0.05):
+    """
+    Hold an exclusive advisory lock on ``<lock_dir>/<name>.lock`` across processes
+
+    Gives up waiting after ``timeout`` seconds and proceeds unlocked, so a stuck
+    holder slows callers down instead of blocking them forever. A no-op where
+    ``fcntl`` is unavailable.
+    """
+    if fcntl is None:
+        yield False
+        return
+
+    handle = _open_lock_file(name, lock_dir)
+    acquired = False
+    try:
+        deadline = time.monotonic() + timeout
+        while not (acquired := _try_lock(handle)):
+            if time.monotonic() >= deadline:
+                logger.warning(f"Timed out waiting for lock {name}, continuing without it")
+                break
+            time.sleep(poll_interval)
+        yield acquired
+    finally:
+        if acquired:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
+
+
+@asynccontextmanager
+async def afile_lock(name, lock_dir=None, timeout=15.0, poll_interval=0.05):
+    """``file_lock`` for coroutines: polls with ``asyncio.sleep`` instead of blocking the loop"""
+    if fcntl is None:
+        yield False
+        return
+
+    handle = _open_lock_file(name, lock_dir)
+    acquired = False
+    try:
+        deadline = time.monotonic() + timeout
+        while not (acquired := _try_lock(handle)):
+            if time.monotonic() >= deadline:
+                logger.warning(f"Timed out waiting for lock {name}, continuing without it")
+                break
+            await asyncio.sleep(poll_interval)
+        yield acquired
+    finally:
+        if acquired:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
@@ -0,0 +1,200 @@
+"""
+Station lookups: an in-process prefix index for autocomplete, and batched
+code -> name resolution.
+
+The index is a few sorted arrays searched with ``bisect``: station codes,
+full station names, and every word of every name (so "cent" finds "Mumbai
+Central"). A search only touches the slice matching the prefix, so ranked
+top-k lookups stay in the microseconds with the full national dataset.
+
+It is built on first use and rebuilt after the table changes. Saves and
+deletes (and ``load_stations``, whose bulk upserts send no signals) bump a
+version in Django's cache; the index rebuilds when it sees a new version, or
+after SEATSWAP_STATION_INDEX_TTL seconds in case the bump happened where the
+cache is not shared (e.g. a locmem cache in another process).
+
+``resolve_station_names`` answers many codes with one StationCode query. With
+``fetch_missing`` it also asks the API for codes the table lacks, stores what
+it learns, and remembers codes the API cannot resolve for
+SEATSWAP_STATION_MISS_TTL seconds so they are not retried upstream on every
+request. The PNR fetch path never does: it only reads the table, which
+``load_stations`` fills.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from railway_api import get_railway_api_client
+from .models import StationCode
+
+
+VERSION_KEY = 'stations:version'
+MISS_KEY_PREFIX = 'stations:miss:'
+
+
+class _PrefixArray:
+    """Sorted (key, station position) pairs answering prefix queries with bisect"""
+
+    def __init__(self, pairs):
+        pairs = sorted(pairs)
+        self.keys = [key for key, _ in pairs]
+        self.positions = [position for _, position in pairs]
+
+    def matches(self, prefix):
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\uffff', start)
+        return self.positions[start:end]
+
+
+class StationIndex:
+    """Ranked prefix search over (code, name, state) tuples"""
+
+    def __init__(self, stations):
+        self.stations = list(stations)
+        self.codes = _PrefixArray((code.lower(), position) for position, (code, _, _) in enumerate(self.stations))
+        self.names = _PrefixArray((name.lower(), position) for position, (_, name, _) in enumerate(self.stations))
+        self.words = _PrefixArray(
+            (word, position)
+            for position, (_, name, _) in enumerate(self.stations)
+            for word in set(name.lower().replace('(', ' ').replace(')', ' ').split()[1:])
+        )
+
+    def search(self, query, limit=10):
+        """
+        Stations matching ``query`` as a code or name prefix, best first
+
+        Ranking: exact code, code prefix, name prefix, then prefix of a later
+        word in the name; alphabetical within each tier.
+        """
+        prefix = query.strip().lower()
+        if not prefix or limit <= 0:
+            return []
+
+        code_matches = self.codes.matches(prefix)
+        exact = [position for position in code_matches[:1] if self.stations[position][0].lower() == prefix]
+        results, seen = [], set()
+        for tier in (exact, code_matches, self.names.matches(prefix), self.words.matches(prefix)):
+            for position in tier:
+                if position not in seen:
+                    seen.add(position)
+                    results.append(self.stations[position])
+                    if len(results) == limit:
+                        return results
+        return results
+
+    def __len__(self):
+        return len(self.stations)
+
+
+_index = None
+_index_version = None
+_built_at = 0.0
+_lock = threading.Lock()
+
+
+def bump_station_version():
+    """Tell every process's index that StationCode changed"""
+    cache.add(VERSION_KEY, 0, None)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(VERSION_KEY, 1, None)
+
+
+def station_index():
+    """The process-wide StationIndex, (re)built if the table changed since it was built"""
+    global _index, _index_version, _built_at
+    version = cache.get(VERSION_KEY)
+    max_age = getattr(settings, 'SEATSWAP_STATION_INDEX_TTL', 3600)
+    if _index is not None and version == _index_version and time.monotonic() - _built_at < max_age:
+        return _index
+
+    with _lock:
+        if _index is None or version != _index_version or time.monotonic() - _built_at >= max_age:
+            stations = StationCode.objects.order_by().values_list('station_code', 'station_name', 'state')
+            _index = StationIndex(stations.iterator())
+            _index_version = version
+            _built_at = time.monotonic()
+        return _index
+
+
+def search_stations(query, limit=10):
+    """Top ``limit`` stations for a code or name prefix"""
+    return station_index().search(query, limit)
+
+
+def resolve_station_names(codes, fetch_missing=True):
+    """
+    Map station codes to names in one database query
+
+    Args:
+        codes (iterable): Station codes, any case; blanks are ignored
+        fetch_missing (bool): Ask the API for codes the table lacks
+
+    Returns:
+        dict: Upper-cased code -> station name, or the code itself when unknown
+    """
+    codes = {code.strip().upper() for code in codes if code and code.strip()}
+    if not codes:
+        return {}
+    names = dict(StationCode.objects.filter(station_code__in=codes).values_list('station_code', 'station_name'))
+
+    missing = codes - names.keys()
+    if missing and fetch_missing:
+        known_misses = cache.get_many([f'{MISS_KEY_PREFIX}{code}' for code in missing])
+        to_fetch = sorted(code for code in missing if f'{MISS_KEY_PREFIX}{code}' not in known_misses)
+        if to_fetch:
+            names.update(_fetch_station_names(to_fetch))
+    return {code: names.get(code, code) for code in codes}
+
+
+def _fetch_station_names(codes):
+    """Ask the API for unknown codes, store the hits and remember the misses"""
+    api_client = get_railway_api_client()
+    found, misses = {}, []
+    for code in codes:
+        name = api_client.get_station_name(code)
+        if name and name != code:
+            found[code] = name
+        else:
+            misses.append(code)
+
+    if found:
+        StationCode.objects.bulk_create(
+            [StationCode(station_code=code, station_name=name) for code, name in found.items()],
+            ignore_conflicts=True,
+        )
+        bump_station_version()
+    if misses:
+        cache.set_many({f'{MISS_KEY_PREFIX}{code}': True for code in misses},
+                       getattr(settings, 'SEATSWAP_STATION_MISS_TTL', 6 * 3600))
+    return found
+
+
+def name_pnr_stations(pnr_datas):
+    """
+    Fill in station names on processed PNR data that only carries codes
+
+    The API returns codes in source_station/destination_station; every such
+    code in the batch is resolved with one StationCode query. Codes the table
+    lacks keep the code as their name rather than costing an upstream call
+    each while a PNR is being fetched.
+    """
+    unnamed = []
+    for pnr_data in pnr_datas:
+        for side in ('source', 'destination'):
+            code = (pnr_data.get(f'{side}_station_code') or '').strip().upper()
+            current = (pnr_data.get(f'{side}_station') or '').strip()
+            # The API copies the upper-case code itself; real names are mixed case
+            if code and (not current or current == code):
+                unnamed.append((pnr_data, f'{side}_station', code))
+
+    if unnamed:
+        names = resolve_station_names((code for _, _, code in unnamed), fetch_missing=False)
+        for pnr_data, field, code in unnamed:
+            pnr_data[field] = names[code]
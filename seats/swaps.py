@@ -0,0 +1,272 @@
+"""
+Multi-party berth swaps on one train and date.
+
+Every traveller with an open SeatRequest and a berth on the train is a node;
+an edge u -> v means v's berth is one u asked for. A swap cycle u1 -> u2 ->
+... -> u1 lets each traveller take the next one's berth, so everyone in it
+gets what they wanted and nobody loses a berth.
+
+Only nodes inside a strongly connected component of two or more can be on a
+cycle, so the graph is first cut down to those components (Tarjan, iterative).
+Within each component, cycles are searched shortest first up to
+``max_length``: 2-cycles are plain swaps, longer ones need more people to
+agree. The search is depth bounded and remembers, per start, which
+(node, depth left) pairs failed to get back, so dense components do not blow
+up; a pair can fail only because the current path blocked it, so a rare cycle
+may be passed over, which greedy proposals can afford. Cycles are taken
+greedily, so every traveller is in at most one proposal.
+"""
+
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+
+from .models import PassengerDetails, SeatRequest, SwapGroup, SwapMove, UserProfile
+
+
+# PassengerDetails.current_berth_code -> SeatListing.seat_type
+BERTH_SEAT_TYPES = {
+    'LB': 'LOWER',
+    'MB': 'MIDDLE',
+    'UB': 'UPPER',
+    'SL': 'SIDE_LOWER',
+    'SLB': 'SIDE_LOWER',
+    'SU': 'SIDE_UPPER',
+    'SUB': 'SIDE_UPPER',
+}
+
+# One traveller's side of the graph: the berth they hold and the request they want served
+Traveller = namedtuple('Traveller', 'user_id seat_request passenger coach_number seat_type travel_class')
+
+
+def strongly_connected_components(graph):
+    """
+    Tarjan's algorithm without recursion
+
+    Args:
+        graph (dict): Node -> iterable of successor nodes
+
+    Returns:
+        list: Components as lists of nodes
+    """
+    index_of, lowlink = {}, {}
+    on_stack, stack, components = set(), [], []
+    counter = 0
+
+    for root in graph:
+        if root in index_of:
+            continue
+        work = [(root, iter(graph.get(root, ())))]
+        index_of[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in index_of:
+                    index_of[successor] = lowlink[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph.get(successor, ()))))
+                    break
+                if successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index_of[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+def _cycle_from(graph, start, length, free):
+    """A cycle of exactly ``length`` nodes through ``start`` using only ``free`` nodes, or None"""
+    dead = set()  # (node, steps left) that cannot get back to start
+    path = [start]
+    on_path = {start}
+
+    def search(node, steps_left):
+        if steps_left == 1:
+            return start in graph[node]
+        for successor in graph[node]:
+            if successor not in free or successor in on_path or (successor, steps_left - 1) in dead:
+                continue
+            path.append(successor)
+            on_path.add(successor)
+            if search(successor, steps_left - 1):
+                return True
+            path.pop()
+            on_path.discard(successor)
+            dead.add((successor, steps_left - 1))
+        return False
+
+    return list(path) if search(start, length) else None
+
+
+def find_swap_cycles(graph, max_length=3):
+    """
+    Disjoint cycles of 2..max_length nodes, shortest first
+
+    Args:
+        graph (dict): Node -> set of successor nodes (u -> v: u wants v's berth)
+        max_length (int): Longest cycle to propose
+
+    Returns:
+        list: Cycles as node lists, each node taking the next one's berth
+    """
+    cycles = []
+    pending = [component for component in strongly_connected_components(graph) if len(component) > 1]
+    length = 2
+    while pending and length <= max_length:
+        remaining = []
+        for component in pending:
+            free = set(component)
+            for start in sorted(component):
+                if start in free:
+                    cycle = _cycle_from(graph, start, length, free)
+                    if cycle:
+                        cycles.append(cycle)
+                        free.difference_update(cycle)
+            # Taking cycles out can split a component; only what is still strongly connected can cycle
+            if len(free) > 1:
+                rest = {node: graph[node] & free for node in free}
+                remaining.extend(part for part in strongly_connected_components(rest) if len(part) > 1)
+        pending = remaining
+        length += 1
+    return cycles
+
+
+def _wants(seat_request, traveller):
+    """Whether ``traveller``'s berth satisfies ``seat_request``"""
+    if seat_request.seat_type and traveller.seat_type != seat_request.seat_type:
+        return False
+    if seat_request.travel_class and traveller.travel_class != seat_request.travel_class:
+        return False
+    return not seat_request.coach_prefix or traveller.coach_number.upper().startswith(seat_request.coach_prefix.upper())
+
+
+def build_swap_graph(travellers):
+    """
+    Edges between travellers whose berth another one asked for
+
+    Travellers whose own berth already satisfies their request are left out.
+    Berths are grouped by (seat type, coach, class), so a request is tested
+    once per group rather than once per berth.
+
+    Args:
+        travellers (dict): Node -> Traveller
+
+    Returns:
+        dict: Node -> set of successor nodes
+    """
+    wanting = {node: traveller for node, traveller in travellers.items()
+               if not _wants(traveller.seat_request, traveller)}
+    groups = {}
+    for node, traveller in wanting.items():
+        groups.setdefault((traveller.seat_type, traveller.coach_number, traveller.travel_class), []).append(node)
+    berths = {key: wanting[nodes[0]] for key, nodes in groups.items()}
+
+    graph = {}
+    for node, traveller in wanting.items():
+        successors = set()
+        for key, nodes in groups.items():
+            if _wants(traveller.seat_request, berths[key]):
+                successors.update(nodes)
+        successors.discard(node)
+        graph[node] = successors
+    return graph
+
+
+def load_travellers(train_number, journey_date):
+    """
+    Travellers on a train and date with an open request and a berth, keyed by user id
+
+    Three queries: open requests, the requesters' current PNRs, and the
+    passengers of those PNRs on this train. A PNR does not say which of its
+    passengers is which user, so the users sharing a group booking take its
+    berthed passengers in serial order, in the order they made their
+    requests; users left over when the berths run out are not travellers.
+    """
+    requests = {}
+    for seat_request in SeatRequest.objects.filter(
+        status='OPEN', train_number=train_number, journey_date=journey_date,
+    ).order_by('created_at'):
+        requests.setdefault(seat_request.requester_id, seat_request)
+
+    request_order = {user_id: position for position, user_id in enumerate(requests)}
+    pnr_users = defaultdict(list)
+    for pnr_number, user_id in (
+        UserProfile.objects.filter(user_id__in=requests.keys())
+        .exclude(current_pnr__isnull=True).exclude(current_pnr='')
+        .values_list('current_pnr', 'user_id')
+    ):
+        pnr_users[pnr_number].append(user_id)
+    unplaced = {pnr_number: iter(sorted(user_ids, key=request_order.get)) for pnr_number, user_ids in pnr_users.items()}
+    passengers = (
+        PassengerDetails.objects.filter(
+            pnr_status__pnr_number__in=pnr_users.keys(),
+            pnr_status__train_number=train_number,
+            pnr_status__journey_date=journey_date,
+        )
+        .select_related('pnr_status')
+        .order_by('pnr_status_id', 'passenger_serial_number')
+    )
+
+    travellers = {}
+    for passenger in passengers:
+        seat_type = BERTH_SEAT_TYPES.get((passenger.current_berth_code or '').upper())
+        if not seat_type or not passenger.current_coach_id:
+            continue
+        user_id = next(unplaced[passenger.pnr_status.pnr_number], None)
+        if user_id is None:
+            continue
+        travellers[user_id] = Traveller(
+            user_id=user_id,
+            seat_request=requests[user_id],
+            passenger=passenger,
+            coach_number=passenger.current_coach_id,
+            seat_type=seat_type,
+            travel_class=passenger.pnr_status.travel_class or '',
+        )
+    return travellers
+
+
+def propose_swaps(train_number, journey_date, max_length=3):
+    """
+    Replace a train's pending swap proposals with the cycles found now
+
+    Returns:
+        list: The new SwapGroup rows
+    """
+    travellers = load_travellers(train_number, journey_date)
+    cycles = find_swap_cycles(build_swap_graph(travellers), max_length)
+
+    with transaction.atomic():
+        SwapGroup.objects.filter(train_number=train_number, journey_date=journey_date, status='PROPOSED').delete()
+        groups = SwapGroup.objects.bulk_create([
+            SwapGroup(train_number=train_number, journey_date=journey_date) for _ in cycles
+        ])
+        moves = []
+        for group, cycle in zip(groups, cycles):
+            for position, user_id in enumerate(cycle):
+                traveller = travellers[user_id]
+                moves.append(SwapMove(
+                    group=group,
+                    traveller_id=user_id,
+                    seat_request=traveller.seat_request,
+                    gives=traveller.passenger,
+                    receives=travellers[cycle[(position + 1) % len(cycle)]].passenger,
+                ))
+        SwapMove.objects.bulk_create(moves)
+    return groups
@@ -9,9 +9,13 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('list-seat/', views.list_seat, name='list_seat'),
     path('browse-seats/', views.browse_seats, name='browse_seats'),
+    path('wanted-seats/', views.seat_requests, name='seat_requests'),
     path('seat/<int:seat_id>/', views.seat_detail, name='seat_detail'),
     path('payment/<int:exchange_id>/', views.payment, name='payment'),
     path('verify-pnr/', views.verify_pnr, name='verify_pnr'),
     path('update-journey/', views.update_journey, name='update_journey'),
+    path('stations/autocomplete/', views.station_autocomplete, name='station_autocomplete'),
     path('admin/exchanges/', views.admin_exchanges, name='admin_exchanges'),
+    path('admin/pnr-cache/', views.pnr_cache_stats, name='pnr_cache_stats'),
+    path('admin/browse-cache/', views.browse_cache_stats, name='browse_cache_stats'),
 ]
@@ -1,17 +1,47 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, authenticate, logout
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.contrib.auth import logout, aauthenticate, alogin
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
+from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils.dateparse import parse_date
 import json
+import logging
 import requests
-from .models import SeatListing, SeatExchange, UserProfile, PNRStatus, StationCode, PassengerDetails
-from .forms import UserRegistrationForm, SeatListingForm, PNRForm, PNRLoginForm
-from railway_api import get_railway_api_client
+from asgiref.sync import sync_to_async
+from .models import (
+    SeatListing, SeatExchange, SeatRequest, UserProfile, PNRStatus, StationCode, PassengerDetails, route_key,
+)
+from .forms import UserRegistrationForm, SeatListingForm, SeatRequestForm, PNRForm, PNRLoginForm
+from .browse_cache import browse_cache
+from .facets import (
+    apply_selection, facet_counts, facet_counts_from_rows, parse_selection, select_rows, with_queries,
+)
+from .holds import hold_expiry
+from .layouts import nearest
+from .pagination import KeysetPage, get_page_queries, get_page_size, keyset_paginate, keyset_paginate_rows
+from .pnr_cache import pnr_cache, pnr_freshness
+from .schedules import assign_listing_stops, covers_segment, get_train_schedule
+from .stations import name_pnr_stations, resolve_station_names, search_stations
+from .singleflight import AsyncSingleFlight, SingleFlight, afile_lock, file_lock, lock_bucket
+from railway_api import get_async_railway_api_client, get_railway_api_client
+
+
+logger = logging.getLogger(__name__)
+
+
+# In-flight upstream PNR fetches in this process, keyed by PNR number
+pnr_flights = SingleFlight()
+apnr_flights = AsyncSingleFlight()
+
+# Templates read the lazy request.user, which needs the database, so async
+# views render in a thread
+arender = sync_to_async(render)
 
 
 def home(request):
@@ -38,18 +68,18 @@ def register(request):
     return render(request, 'seats/register.html', {'form': form})
 
 
-def login_view(request):
+async def login_view(request):
     """User login view with PNR verification"""
     if request.method == 'POST':
         if 'username' in request.POST:
             # Initial login step
             username = request.POST['username']
             password = request.POST['password']
-            user = authenticate(request, username=username, password=password)
+            user = await aauthenticate(request, username=username, password=password)
             if user is not None:
                 # User is authenticated, now ask for PNR
-                request.session['pending_user_id'] = user.id
-                return render(request, 'seats/pnr_login.html', {'form': PNRLoginForm()})
+                await request.session.aset('pending_user_id', user.id)
+                return await arender(request, 'seats/pnr_login.html', {'form': PNRLoginForm()})
             else:
                 messages.error(request, 'Invalid username or password.')
         elif 'pnr_number' in request.POST:
@@ -57,38 +87,30 @@ def login_view(request):
             form = PNRLoginForm(request.POST)
             if form.is_valid():
                 pnr_number = form.cleaned_data['pnr_number']
-                user_id = request.session.get('pending_user_id')
+                user_id = await request.session.aget('pending_user_id')
                 
                 if user_id:
-                    user = User.objects.get(id=user_id)
+                    user = await User.objects.aget(id=user_id)
                     
-                    # Fetch PNR data
-                    pnr_data = fetch_pnr_status(pnr_number)
+                    # Fetch PNR data without holding a worker thread
+                    pnr_data = await afetch_pnr_status(pnr_number)
                     if pnr_data:
                         # Update user profile with journey details
-                        user_profile, created = UserProfile.objects.get_or_create(user=user)
-                        user_profile.current_pnr = pnr_number
-                        user_profile.source_station = pnr_data.get('source_station', '')
-                        user_profile.destination_station = pnr_data.get('destination_station', '')
-                        user_profile.source_station_code = pnr_data.get('source_station_code', '')
-                        user_profile.destination_station_code = pnr_data.get('destination_station_code', '')
-                        user_profile.journey_date = pnr_data.get('journey_date')
-                        user_profile.travel_class = pnr_data.get('travel_class', '')
-                        user_profile.pnr_updated_at = timezone.now()
-                        user_profile.save()
+                        user_profile, created = await UserProfile.objects.aget_or_create(user=user)
+                        await save_journey(user_profile, pnr_number, pnr_data)
                         
                         # Complete login
-                        login(request, user)
-                        del request.session['pending_user_id']
+                        await alogin(request, user)
+                        await request.session.apop('pending_user_id', None)
                         messages.success(request, f'Welcome! Journey: {pnr_data.get("source_station")} → {pnr_data.get("destination_station")}')
                         return redirect('dashboard')
                     else:
                         messages.error(request, 'Invalid PNR number or PNR data not found.')
-                        return render(request, 'seats/pnr_login.html', {'form': form})
+                        return await arender(request, 'seats/pnr_login.html', {'form': form})
             else:
-                return render(request, 'seats/pnr_login.html', {'form': form})
+                return await arender(request, 'seats/pnr_login.html', {'form': form})
     
-    return render(request, 'seats/login.html')
+    return await arender(request, 'seats/login.html')
 
 
 def logout_view(request):
@@ -121,7 +143,7 @@ def dashboard(request):
 
 
 @login_required
-def update_journey(request):
+async def update_journey(request):
     """Allow users to update their journey details"""
     if request.method == 'POST':
         form = PNRLoginForm(request.POST)
@@ -129,19 +151,11 @@ def update_journey(request):
             pnr_number = form.cleaned_data['pnr_number']
             
             # Fetch PNR data
-            pnr_data = fetch_pnr_status(pnr_number)
+            pnr_data = await afetch_pnr_status(pnr_number)
             if pnr_data:
                 # Update user profile with journey details
-                user_profile, created = UserProfile.objects.get_or_create(user=request.user)
-                user_profile.current_pnr = pnr_number
-                user_profile.source_station = pnr_data.get('source_station', '')
-                user_profile.destination_station = pnr_data.get('destination_station', '')
-                user_profile.source_station_code = pnr_data.get('source_station_code', '')
-                user_profile.destination_station_code = pnr_data.get('destination_station_code', '')
-                user_profile.journey_date = pnr_data.get('journey_date')
-                user_profile.travel_class = pnr_data.get('travel_class', '')
-                user_profile.pnr_updated_at = timezone.now()
-                user_profile.save()
+                user_profile, created = await UserProfile.objects.aget_or_create(user=await request.auser())
+                await save_journey(user_profile, pnr_number, pnr_data)
                 
                 messages.success(request, f'Journey details updated! Route: {pnr_data.get("source_station")} → {pnr_data.get("destination_station")}')
                 return redirect('dashboard')
@@ -150,20 +164,35 @@ def update_journey(request):
     else:
         form = PNRLoginForm()
     
-    return render(request, 'seats/update_journey.html', {'form': form})
+    return await arender(request, 'seats/update_journey.html', {'form': form})
+
+
+async def save_journey(user_profile, pnr_number, pnr_data):
+    """Copy the journey from PNR data onto a user's profile and save it"""
+    user_profile.current_pnr = pnr_number
+    user_profile.train_number = pnr_data.get('train_number', '')
+    user_profile.source_station = pnr_data.get('source_station', '')
+    user_profile.destination_station = pnr_data.get('destination_station', '')
+    user_profile.source_station_code = pnr_data.get('source_station_code', '')
+    user_profile.destination_station_code = pnr_data.get('destination_station_code', '')
+    user_profile.journey_date = pnr_data.get('journey_date')
+    user_profile.travel_class = known_travel_class(pnr_data.get('travel_class'))
+    user_profile.pnr_updated_at = timezone.now()
+    await user_profile.asave()
 
 
 @login_required
-def list_seat(request):
+async def list_seat(request):
     """List a seat for exchange"""
     if request.method == 'POST':
         form = SeatListingForm(request.POST)
-        if form.is_valid():
+        # ModelForm validation may query the database
+        if await sync_to_async(form.is_valid)():
             seat_listing = form.save(commit=False)
-            seat_listing.owner = request.user
+            seat_listing.owner = await request.auser()
             
             # Fetch PNR details
-            pnr_data = fetch_pnr_status(seat_listing.pnr_number)
+            pnr_data = await afetch_pnr_status(seat_listing.pnr_number)
             if pnr_data:
                 seat_listing.train_number = pnr_data.get('train_number', '')
                 seat_listing.train_name = pnr_data.get('train_name', '')
@@ -172,8 +201,11 @@ def list_seat(request):
                 seat_listing.source_station_code = pnr_data.get('source_station_code', '')
                 seat_listing.destination_station_code = pnr_data.get('destination_station_code', '')
                 seat_listing.journey_date = pnr_data.get('journey_date', timezone.now().date())
+                seat_listing.travel_class = known_travel_class(pnr_data.get('travel_class'))
+                # Stop numbers along the route let buyers on a shorter stretch of the train find it
+                await sync_to_async(assign_listing_stops)(seat_listing)
             
-            seat_listing.save()
+            await seat_listing.asave()
             messages.success(request, 'Seat listed successfully!')
             return redirect('dashboard')
         else:
@@ -181,7 +213,44 @@ def list_seat(request):
     else:
         form = SeatListingForm()
     
-    return render(request, 'seats/list_seat.html', {'form': form})
+    return await arender(request, 'seats/list_seat.html', {'form': form})
+
+
+@login_required
+def seat_requests(request):
+    """Post a "wanted seat" request and see the listings matched to your open requests"""
+    if request.method == 'POST':
+        cancel_id = request.POST.get('cancel', '').strip()
+        if cancel_id:
+            if cancel_id.isdigit():
+                SeatRequest.objects.filter(id=cancel_id, requester=request.user, status='OPEN').update(status='CANCELLED')
+                messages.success(request, 'Request cancelled.')
+            else:
+                messages.error(request, 'Invalid request to cancel.')
+            return redirect('seat_requests')
+        
+        form = SeatRequestForm(request.POST)
+        if form.is_valid():
+            seat_request = form.save(commit=False)
+            seat_request.requester = request.user
+            seat_request.save()
+            messages.success(request, 'Request saved! Matching seats will show up here as they are listed.')
+            return redirect('seat_requests')
+        messages.error(request, 'Please correct the errors below.')
+    else:
+        # Default to the user's current journey
+        profile = UserProfile.objects.filter(user=request.user).first()
+        initial = {}
+        if profile:
+            initial = {'train_number': profile.train_number, 'journey_date': profile.journey_date,
+                       'travel_class': profile.travel_class}
+        form = SeatRequestForm(initial=initial)
+    
+    open_requests = (
+        SeatRequest.objects.filter(requester=request.user, status='OPEN')
+        .prefetch_related('matches__listing__owner')
+    )
+    return render(request, 'seats/seat_requests.html', {'form': form, 'open_requests': open_requests})
 
 
 @login_required
@@ -192,7 +261,7 @@ def browse_seats(request):
         user_source = user_profile.source_station or user_profile.source_station_code
         user_destination = user_profile.destination_station or user_profile.destination_station_code
         user_journey_date = user_profile.journey_date
-        user_travel_class = user_profile.travel_class
+        user_travel_class = known_travel_class(user_profile.travel_class)
     except UserProfile.DoesNotExist:
         messages.warning(request, 'Please update your journey details to see relevant seats.')
         return redirect('dashboard')
@@ -207,86 +276,302 @@ def browse_seats(request):
     search_destination = request.GET.get('destination_station', '')
     search_date = request.GET.get('journey_date', '')
     
-    # Base filter: same route as user's journey
-    seats = SeatListing.objects.filter(
-        status='AVAILABLE'
-    ).exclude(owner=request.user)
-    
-    # Filter by user's journey route
-    seats = seats.filter(
-        Q(source_station__icontains=user_source) | Q(source_station_code__icontains=user_source),
-        Q(destination_station__icontains=user_destination) | Q(destination_station_code__icontains=user_destination)
+    # Resolve every free-text station to an exact code in one query so the route index can be used
+    (user_source_code, user_destination_code,
+     search_source_code, search_destination_code) = resolve_station_codes(
+        '' if user_profile.source_station_code else user_profile.source_station,
+        '' if user_profile.destination_station_code else user_profile.destination_station,
+        search_source,
+        search_destination,
     )
+    user_source_code = user_profile.source_station_code or user_source_code
+    user_destination_code = user_profile.destination_station_code or user_destination_code
+    # A partial name ("mumbai cent") stands for a station when the prefix index finds only one
+    search_source_code = search_source_code or unique_station_code(search_source)
+    search_destination_code = search_destination_code or unique_station_code(search_destination)
+    
+    seats = SeatListing.objects.filter(status='AVAILABLE')
+    
+    # Segment matching: listings on the user's train whose stretch of the route covers the
+    # journey, not only the exact same one (served by seats_listing_segment_idx)
+    match_segment = request.GET.get('match') == 'segment'
+    segment = None
+    if match_segment:
+        # Text the station table does not know may still be a code on the train's route
+        segment_source = (search_source_code or search_source) if search_source else user_source_code
+        segment_destination = (search_destination_code or search_destination) if search_destination else user_destination_code
+        segment = get_train_schedule(user_profile.train_number).segment(segment_source, segment_destination)
+        if segment is None:
+            messages.info(request, 'The route of your train is not known for this journey; showing exact route matches.')
+    
+    journey_date = user_journey_date
+    if search_date:
+        try:
+            journey_date = parse_date(search_date)
+        except ValueError:
+            journey_date = None
+        if journey_date is None:
+            messages.error(request, 'Invalid journey date.')
+            journey_date = user_journey_date
+    
+    # The profile's stations and any searched ones must all agree, so one code per end
+    source_codes = {user_source_code, search_source_code} if search_source else {user_source_code}
+    destination_codes = {user_destination_code, search_destination_code} if search_destination else {user_destination_code}
+    keyed = all(source_codes | destination_codes) and len(source_codes) == len(destination_codes) == 1
     
-    # Additional filtering based on search parameters
-    if search_source:
+    route = ''
+    if segment:
+        # Exact matches too, for listings whose stops were never filled in (route unknown when listed)
         seats = seats.filter(
-            Q(source_station__icontains=search_source) | Q(source_station_code__icontains=search_source)
+            covers_segment(segment) | route_filter(segment_source, segment_destination, journey_date),
+            train_number=user_profile.train_number,
         )
-    
-    if search_destination:
+    elif keyed:
+        # Same route as the user's journey: one route_key lookup on seats_listing_route_idx
+        if user_profile.route_key and not (search_source or search_destination or search_date):
+            route = user_profile.route_key
+        else:
+            route = route_key(*source_codes, *destination_codes, journey_date)
+        seats = seats.filter(route_key=route) if route else seats.filter(route_filter(*source_codes, *destination_codes))
+    else:
+        # Some station of the profile is only known by name: match each end separately
         seats = seats.filter(
-            Q(destination_station__icontains=search_destination) | Q(destination_station_code__icontains=search_destination)
+            station_filter('source', user_source_code, user_profile.source_station),
+            station_filter('destination', user_destination_code, user_profile.destination_station),
         )
+        
+        # Additional filtering based on search parameters
+        if search_source_code:
+            seats = seats.filter(source_station_code=search_source_code)
+        
+        if search_destination_code:
+            seats = seats.filter(destination_station_code=search_destination_code)
+        
+        # Searched text is never matched with a wildcard: it names a station or finds nothing
+        unresolved = [text for text, code in ((search_source, search_source_code),
+                                              (search_destination, search_destination_code)) if text and not code]
+        if unresolved:
+            messages.info(request, f'No station found for {", ".join(unresolved)}; pick one from the suggestions.')
+            seats = seats.none()
     
-    if search_date:
-        seats = seats.filter(journey_date=search_date)
-    elif user_journey_date:
-        # If no search date specified, filter by user's journey date
-        seats = seats.filter(journey_date=user_journey_date)
+    if journey_date and (segment or not keyed):
+        seats = seats.filter(journey_date=journey_date)
     
-    # Optional: Filter by same travel class
+    # A seat only helps on the user's own train and class (served by seats_listing_class_idx)
+    if user_profile.train_number and not segment:
+        seats = seats.filter(train_number=user_profile.train_number)
+    # Listings whose class was never learned (PNR fetch failed when listed) may still be a match
     if user_travel_class:
-        # You might want to add travel_class field to SeatListing model for better filtering
-        pass
+        seats = seats.filter(Q(travel_class=user_travel_class) | Q(travel_class__isnull=True))
+    
+    selection = parse_selection(request.GET)
+    page_size = get_page_size(request, getattr(settings, 'SEATSWAP_BROWSE_PAGE_SIZE', 20))
+    sort_price = request.GET.get('sort') == 'price'
+    ordering = ('price', 'id') if sort_price else ('-created_at', '-id')
+    
+    # Nearest first: the closest seats to the user's own berth on their train, one page only
+    order_nearest = request.GET.get('order') == 'nearest'
+    berth = current_berth(user_profile) if order_nearest and user_profile.train_number else None
+    if order_nearest and berth is None:
+        messages.info(request, 'Your berth on this train is not known yet; showing the newest seats first.')
+    
+    # One route's rows are shared by everyone browsing it (see seats.browse_cache)
+    cached = None
+    if route and not berth:
+        variant = f'{user_profile.train_number or ""}:{user_travel_class or ""}'
+        cached = browse_cache.rows(route, seats, variant)
+    
+    if cached is not None:
+        cached = [row for row in cached if row.owner_id != request.user.id]
+        facets = facet_counts_from_rows(cached, selection)
+        rows = keyset_paginate_rows(select_rows(cached, selection), SeatListing, request.GET.get('cursor'),
+                                    page_size, ordering=ordering)
+        # Only the page's listings are loaded; one booked since the rows were cached drops out
+        listings = SeatListing.objects.filter(status='AVAILABLE').select_related('owner').order_by().in_bulk(
+            [row.id for row in rows])
+        page = KeysetPage([listings[row.id] for row in rows if row.id in listings], rows.next_cursor)
+    else:
+        # Facet counts cover the route before the user's facet choices narrow it, in one GROUP BY
+        seats = seats.exclude(owner=request.user)
+        facets = facet_counts(seats, selection)
+        seats = apply_selection(seats, selection).select_related('owner')
+        if berth:
+            coach, berth_no = berth
+            nearby = nearest(seats.order_by('-created_at', '-id').iterator(), user_travel_class, coach, berth_no, page_size)
+            page = KeysetPage(nearby, None)
+        else:
+            # Keyset pagination: newest (or cheapest, on seats_listing_route_price_idx) first,
+            # each page a fixed number of queries
+            page = keyset_paginate(seats, request.GET.get('cursor'), page_size, ordering=ordering)
+    first_page_query, next_page_query = get_page_queries(request, page)
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'results': [serialize_listing(seat) for seat in page],
+            'facets': facets,
+            'next_cursor': page.next_cursor,
+            'next_page': f"{request.path}?{next_page_query}&format=json" if next_page_query else None,
+        })
     
     context = {
-        'seats': seats,
+        'seats': page,
+        'next_cursor': page.next_cursor,
+        'next_page_query': next_page_query,
+        'first_page_query': first_page_query,
+        'is_first_page': not request.GET.get('cursor'),
         'user_source': user_source,
         'user_destination': user_destination,
+        'user_source_code': user_source_code or user_source,
+        'user_destination_code': user_destination_code or user_destination,
         'user_journey_date': user_journey_date,
         'user_travel_class': user_travel_class,
         'search_source': search_source,
         'search_destination': search_destination,
         'search_date': search_date,
+        'match_segment': match_segment,
+        'order_nearest': bool(berth),
+        'sort_price': sort_price,
+        'facets': with_queries(facets, request.GET),
+        'facet_selection': selection,
+        'user_berth': berth,
     }
     return render(request, 'seats/browse_seats.html', context)
 
 
+def current_berth(user_profile):
+    """(coach, berth number) held on the user's current PNR, from its first passenger with a berth; or None"""
+    if not user_profile.current_pnr:
+        return None
+    passenger = (
+        PassengerDetails.objects.filter(pnr_status__pnr_number=user_profile.current_pnr, current_berth_no__gt=0)
+        .exclude(current_coach_id='')
+        .order_by('passenger_serial_number')
+        .values_list('current_coach_id', 'current_berth_no')
+        .first()
+    )
+    return tuple(passenger) if passenger else None
+
+
+def serialize_listing(seat):
+    """JSON-friendly representation of a seat listing for API consumers"""
+    return {
+        'id': seat.id,
+        'train_number': seat.train_number,
+        'train_name': seat.train_name,
+        'source_station': seat.source_station,
+        'destination_station': seat.destination_station,
+        'source_station_code': seat.source_station_code,
+        'destination_station_code': seat.destination_station_code,
+        'journey_date': seat.journey_date,
+        'travel_class': seat.travel_class,
+        'seat_type': seat.seat_type,
+        'seat_number': seat.seat_number,
+        'coach_number': seat.coach_number,
+        'price': str(seat.price),
+        'description': seat.description,
+        'owner': seat.owner.username,
+        'created_at': seat.created_at,
+    }
+
+
 @login_required
-def seat_detail(request, seat_id):
+async def seat_detail(request, seat_id):
     """View seat details"""
-    seat = get_object_or_404(SeatListing, id=seat_id, status='AVAILABLE')
+    seat = await aget_object_or_404(SeatListing.objects.select_related('owner'), id=seat_id, status='AVAILABLE')
     
     if request.method == 'POST':
         # Handle seat booking
         buyer_pnr = request.POST.get('buyer_pnr')
         if buyer_pnr:
-            # Verify buyer's PNR has same route
-            pnr_data = fetch_pnr_status(buyer_pnr)
-            if pnr_data and (
-                pnr_data.get('source_station_code') == seat.source_station_code and
-                pnr_data.get('destination_station_code') == seat.destination_station_code
-            ):
-                # Create exchange record
-                exchange = SeatExchange.objects.create(
-                    seat_listing=seat,
-                    buyer=request.user,
-                    seller=seat.owner,
-                    exchange_amount=seat.price,
-                    buyer_pnr=buyer_pnr
-                )
-                seat.status = 'BOOKED'
-                seat.save()
+            # Verify buyer's PNR has same route, before anything is claimed
+            pnr_data = await afetch_pnr_status(buyer_pnr)
+            if pnr_data and await sync_to_async(seat_covers_journey)(seat, pnr_data):
+                exchange = await sync_to_async(claim_listing)(seat, await request.auser(), buyer_pnr)
+                if exchange is None:
+                    messages.error(request, 'Sorry, this seat was just booked by someone else or its price changed.')
+                    return redirect('browse_seats')
                 
                 messages.success(request, 'Seat booked successfully! Please complete the payment.')
                 return redirect('payment', exchange_id=exchange.id)
             else:
-                messages.error(request, 'PNR route does not match the seat route.')
+                messages.error(request, 'Your PNR journey is not covered by this seat.')
         else:
             messages.error(request, 'Please enter your PNR number.')
     
-    return render(request, 'seats/seat_detail.html', {'seat': seat})
+    return await arender(request, 'seats/seat_detail.html', {'seat': seat})
+
+
+def seat_covers_journey(seat, pnr_data):
+    """Whether a listing's seat is good for the whole journey on a PNR: same route, or a longer stretch of the same train"""
+    source_code = pnr_data.get('source_station_code')
+    destination_code = pnr_data.get('destination_station_code')
+    if seat.route_key and route_key(source_code, destination_code, pnr_data.get('journey_date')) == seat.route_key:
+        return True
+    if (seat.source_stop is None or pnr_data.get('train_number') != seat.train_number
+            or str(pnr_data.get('journey_date')) != str(seat.journey_date)):
+        return False
+    segment = get_train_schedule(seat.train_number).segment(source_code, destination_code)
+    return segment is not None and seat.source_stop <= segment[0] and seat.destination_stop >= segment[1]
+
+
+def claim_listing(seat, buyer, buyer_pnr):
+    """
+    Book a listing for a buyer, unless someone else got there first
+    
+    The listing is claimed with one conditional UPDATE on its status (and
+    the price the buyer saw), so concurrent buyers never queue on a row lock
+    held across the PNR check: the first UPDATE wins and the rest match no
+    row. Only the winner creates the exchange, in the same short transaction.
+    
+    Returns:
+        SeatExchange: The new PENDING exchange, or None if the seat was taken
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = SeatListing.objects.filter(id=seat.id, status='AVAILABLE', price=seat.price).update(
+            status='BOOKED', updated_at=now,
+        )
+        if not claimed:
+            return None
+        browse_cache.bump_on_commit([seat.route_key])
+        return SeatExchange.objects.create(
+            seat_listing=seat,
+            buyer=buyer,
+            seller_id=seat.owner_id,
+            exchange_amount=seat.price,
+            buyer_pnr=buyer_pnr,
+            hold_expires_at=hold_expiry(now),
+        )
+
+
+def complete_payment(exchange, transaction_id):
+    """
+    Mark a PENDING exchange paid and its listing completed
+    
+    Both are conditional UPDATEs in one transaction, so a double submit pays
+    once, a hold that has run out (and may be released by the sweeper) cannot
+    be paid, and the listing moves on only from BOOKED. The buyer's open
+    "wanted seat" requests matched to the listing are fulfilled with it.
+    
+    Returns:
+        bool: Whether this call recorded the payment
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        paid = SeatExchange.objects.filter(
+            Q(hold_expires_at__isnull=True) | Q(hold_expires_at__gt=now), id=exchange.id, payment_status='PENDING',
+        ).update(
+            payment_transaction_id=transaction_id, payment_status='PAID', completion_date=now,
+        )
+        if not paid:
+            return False
+        SeatListing.objects.filter(id=exchange.seat_listing_id, status='BOOKED').update(
+            status='COMPLETED', updated_at=now,
+        )
+        SeatRequest.objects.filter(
+            requester_id=exchange.buyer_id, status='OPEN', matches__listing_id=exchange.seat_listing_id,
+        ).update(status='FULFILLED')
+    return True
 
 
 @login_required
@@ -298,15 +583,10 @@ def payment(request, exchange_id):
         # Handle payment completion
         transaction_id = request.POST.get('transaction_id')
         if transaction_id:
-            exchange.payment_transaction_id = transaction_id
-            exchange.payment_status = 'PAID'
-            exchange.completion_date = timezone.now()
-            exchange.save()
-            
-            exchange.seat_listing.status = 'COMPLETED'
-            exchange.seat_listing.save()
-            
-            messages.success(request, 'Payment completed successfully!')
+            if complete_payment(exchange, transaction_id):
+                messages.success(request, 'Payment completed successfully!')
+            else:
+                messages.error(request, 'This exchange is no longer awaiting payment, or its seat hold has expired.')
             return redirect('dashboard')
         else:
             messages.error(request, 'Please enter transaction ID.')
@@ -315,12 +595,12 @@ def payment(request, exchange_id):
 
 
 @login_required
-def verify_pnr(request):
+async def verify_pnr(request):
     """AJAX view to verify PNR"""
     if request.method == 'POST':
         pnr_number = request.POST.get('pnr_number')
         
-        pnr_data = fetch_pnr_status(pnr_number)
+        pnr_data = await afetch_pnr_status(pnr_number)
         
         if pnr_data:
             return JsonResponse({
@@ -337,132 +617,384 @@ def verify_pnr(request):
 
 
 def fetch_pnr_status(pnr_number):
-    """Fetch PNR status from API"""
+    """Fetch PNR status: in-process LRU, then Django cache, then PNRStatus table, then API"""
     try:
-        # Check if we have cached data (extended to 24 hours to reduce API calls)
-        try:
-            pnr_status = PNRStatus.objects.get(pnr_number=pnr_number)
-            # If cached data is less than 24 hours old, use it
-            if (timezone.now() - pnr_status.last_updated).total_seconds() < 86400:  # 24 hours
-                # Get passenger details for cached data
-                passengers = []
-                for passenger in pnr_status.passengers.all():
-                    passengers.append({
-                        'passenger_serial_number': passenger.passenger_serial_number,
-                        'booking_status': passenger.booking_status,
-                        'booking_coach_id': passenger.booking_coach_id,
-                        'booking_berth_no': passenger.booking_berth_no,
-                        'booking_berth_code': passenger.booking_berth_code,
-                        'current_status': passenger.current_status,
-                        'current_coach_id': passenger.current_coach_id,
-                        'current_berth_no': passenger.current_berth_no,
-                        'current_berth_code': passenger.current_berth_code,
-                        'current_status_details': f"{passenger.current_status}/{passenger.current_coach_id}/{passenger.current_berth_no}/{passenger.current_berth_code}",
-                    })
-                
-                return {
-                    'train_number': pnr_status.train_number,
-                    'train_name': pnr_status.train_name,
-                    'source_station': pnr_status.source_station,
-                    'destination_station': pnr_status.destination_station,
-                    'source_station_code': pnr_status.source_station_code,
-                    'destination_station_code': pnr_status.destination_station_code,
-                    'journey_date': pnr_status.journey_date,
-                    'passenger_count': pnr_status.passenger_count,
-                    'travel_class': pnr_status.travel_class or 'N/A',  # Use stored travel class
-                    'passengers': passengers,  # Add passenger details
-                }
-        except PNRStatus.DoesNotExist:
-            pass
+        pnr_data, policy = lookup_pnr_status(pnr_number)
+        if pnr_data is not None:
+            return pnr_data
+        
+        # Concurrent lookups of the same PNR share one upstream fetch
+        return pnr_flights.do(pnr_number, lambda: refresh_pnr_status(pnr_number, policy))
+        
+    except Exception:
+        logger.exception('Error fetching PNR status for %s', pnr_number)
+        return None
+
+
+async def afetch_pnr_status(pnr_number):
+    """fetch_pnr_status for async views: the upstream call is awaited, not run on a thread"""
+    try:
+        pnr_data, policy = await sync_to_async(lookup_pnr_status)(pnr_number)
+        if pnr_data is not None:
+            return pnr_data
+        
+        return await apnr_flights.do(pnr_number, lambda: arefresh_pnr_status(pnr_number, policy))
+        
+    except Exception:
+        logger.exception('Error fetching PNR status for %s', pnr_number)
+        return None
+
+
+def lookup_pnr_status(pnr_number):
+    """Return (cached or stored PNR data if still fresh else None, freshness policy) without the API"""
+    cached_data = pnr_cache.get(pnr_number)
+    if cached_data is not None:
+        policy = pnr_freshness(cached_data)[0]
+        pnr_cache.record_policy(policy, hit=True)
+        return cached_data, policy
+    return load_stored_pnr(pnr_number)
+
+
+def load_stored_pnr(pnr_number):
+    """Return (stored PNR data if still fresh else None, freshness policy)"""
+    # Stored data is reused while it is fresh for its journey state (see pnr_freshness)
+    try:
+        pnr_status = PNRStatus.objects.prefetch_related('passengers').get(pnr_number=pnr_number)
+    except PNRStatus.DoesNotExist:
+        return None, 'new'
+    
+    pnr_data = pnr_status_to_dict(pnr_status)
+    policy, ttl = pnr_freshness(pnr_data)
+    age = (timezone.now() - pnr_status.last_updated).total_seconds()
+    if policy == 'past' or age < ttl:
+        pnr_cache.record('db_hits')
+        pnr_cache.record_policy(policy, hit=True)
+        pnr_cache.set(pnr_number, pnr_data, timeout=ttl if policy == 'past' else int(ttl - age))
+        return pnr_data, policy
+    return None, policy
+
+
+def refresh_pnr_status(pnr_number, policy='new'):
+    """Fetch a PNR from the API and store it, one worker process at a time"""
+    with file_lock(pnr_lock_name(pnr_number), lock_dir=getattr(settings, 'SEATSWAP_PNR_LOCK_DIR', None)):
+        # Another worker may have stored it while we waited for the lock
+        pnr_data, policy = load_stored_pnr(pnr_number)
+        if pnr_data is not None:
+            return pnr_data
         
         # Get API client and fetch PNR status (only if not cached)
+        pnr_cache.record_policy(policy, hit=False)
         api_client = get_railway_api_client()
         pnr_data = api_client.get_pnr_status(pnr_number)
+        pnr_cache.record('api_calls')
         
         if pnr_data:
-            # Store in database for caching
-            pnr_status, created = PNRStatus.objects.update_or_create(
-                pnr_number=pnr_number,
-                defaults={
-                    'train_number': pnr_data.get('train_number', ''),
-                    'train_name': pnr_data.get('train_name', ''),
-                    'source_station': pnr_data.get('source_station', ''),
-                    'destination_station': pnr_data.get('destination_station', ''),
-                    'source_station_code': pnr_data.get('source_station_code', ''),
-                    'destination_station_code': pnr_data.get('destination_station_code', ''),
-                    'journey_date': pnr_data.get('journey_date', timezone.now().date()),
-                    'passenger_count': pnr_data.get('passenger_count', 1),
-                    'travel_class': pnr_data.get('travel_class', ''),  # Now storing travel class
-                }
-            )
-            
-            # Clear existing passenger details and save new ones
-            pnr_status.passengers.all().delete()
-            passengers_data = pnr_data.get('passengers', [])
-            for passenger_info in passengers_data:
-                PassengerDetails.objects.create(
-                    pnr_status=pnr_status,
-                    passenger_serial_number=passenger_info.get('passenger_serial_number', 0),
-                    booking_status=passenger_info.get('booking_status', ''),
-                    booking_coach_id=passenger_info.get('booking_coach_id', ''),
-                    booking_berth_no=passenger_info.get('booking_berth_no', 0),
-                    booking_berth_code=passenger_info.get('booking_berth_code', ''),
-                    current_status=passenger_info.get('current_status', ''),
-                    current_coach_id=passenger_info.get('current_coach_id', ''),
-                    current_berth_no=passenger_info.get('current_berth_no', 0),
-                    current_berth_code=passenger_info.get('current_berth_code', ''),
-                )
-            
+            save_fetched_pnr(pnr_number, pnr_data)
             return pnr_data
         
         return None
+
+
+async def arefresh_pnr_status(pnr_number, policy='new'):
+    """refresh_pnr_status for async views"""
+    async with afile_lock(pnr_lock_name(pnr_number), lock_dir=getattr(settings, 'SEATSWAP_PNR_LOCK_DIR', None)):
+        pnr_data, policy = await sync_to_async(load_stored_pnr)(pnr_number)
+        if pnr_data is not None:
+            return pnr_data
+        
+        pnr_cache.record_policy(policy, hit=False)
+        api_client = get_async_railway_api_client()
+        pnr_data = await api_client.get_pnr_status(pnr_number)
+        pnr_cache.record('api_calls')
+        
+        if pnr_data:
+            await sync_to_async(save_fetched_pnr)(pnr_number, pnr_data)
+            return pnr_data
         
-    except Exception as e:
-        print(f"Error fetching PNR status: {e}")
         return None
 
 
+def pnr_lock_name(pnr_number):
+    """Lock file guarding upstream fetches of a PNR (shared with other PNRs in its bucket)"""
+    return lock_bucket('pnr', pnr_number, getattr(settings, 'SEATSWAP_PNR_LOCK_BUCKETS', 64))
+
+
+def save_fetched_pnr(pnr_number, pnr_data):
+    """Store freshly fetched PNR data and cache it for its freshness window"""
+    name_pnr_stations([pnr_data])
+    store_pnr_status(pnr_number, pnr_data)
+    pnr_cache.set(pnr_number, pnr_data, timeout=pnr_freshness(pnr_data)[1])
+
+
+def pnr_status_to_dict(pnr_status):
+    """Build the processed PNR dict from a stored PNRStatus and its passengers"""
+    passengers = []
+    for passenger in pnr_status.passengers.all():
+        passengers.append({
+            'passenger_serial_number': passenger.passenger_serial_number,
+            'booking_status': passenger.booking_status,
+            'booking_coach_id': passenger.booking_coach_id,
+            'booking_berth_no': passenger.booking_berth_no,
+            'booking_berth_code': passenger.booking_berth_code,
+            'current_status': passenger.current_status,
+            'current_coach_id': passenger.current_coach_id,
+            'current_berth_no': passenger.current_berth_no,
+            'current_berth_code': passenger.current_berth_code,
+            'current_status_details': f"{passenger.current_status}/{passenger.current_coach_id}/{passenger.current_berth_no}/{passenger.current_berth_code}",
+        })
+    
+    return {
+        'train_number': pnr_status.train_number,
+        'train_name': pnr_status.train_name,
+        'source_station': pnr_status.source_station,
+        'destination_station': pnr_status.destination_station,
+        'source_station_code': pnr_status.source_station_code,
+        'destination_station_code': pnr_status.destination_station_code,
+        'journey_date': pnr_status.journey_date,
+        'passenger_count': pnr_status.passenger_count,
+        'travel_class': known_travel_class(pnr_status.travel_class),  # Use stored travel class
+        'chart_prepared': pnr_status.chart_prepared,
+        'passengers': passengers,  # Add passenger details
+    }
+
+
+def known_travel_class(travel_class):
+    """A travel class as stored and filtered on, or None when blank or 'N/A'"""
+    travel_class = (travel_class or '').strip().upper()
+    return None if travel_class in ('', 'N/A') else travel_class
+
+
+def pnr_status_fields(pnr_data):
+    """PNRStatus column values for processed PNR data"""
+    return {
+        'train_number': pnr_data.get('train_number', ''),
+        'train_name': pnr_data.get('train_name', ''),
+        'source_station': pnr_data.get('source_station', ''),
+        'destination_station': pnr_data.get('destination_station', ''),
+        'source_station_code': pnr_data.get('source_station_code', ''),
+        'destination_station_code': pnr_data.get('destination_station_code', ''),
+        'journey_date': pnr_data.get('journey_date', timezone.now().date()),
+        'passenger_count': pnr_data.get('passenger_count', 1),
+        'travel_class': known_travel_class(pnr_data.get('travel_class')),  # Now storing travel class
+        'chart_prepared': bool(pnr_data.get('chart_prepared', False)),
+    }
+
+
+def passenger_details(pnr_status, passenger_info):
+    """Unsaved PassengerDetails row for one passenger of processed PNR data"""
+    return PassengerDetails(
+        pnr_status=pnr_status,
+        passenger_serial_number=passenger_info.get('passenger_serial_number', 0),
+        booking_status=passenger_info.get('booking_status', ''),
+        booking_coach_id=passenger_info.get('booking_coach_id', ''),
+        booking_berth_no=passenger_info.get('booking_berth_no', 0),
+        booking_berth_code=passenger_info.get('booking_berth_code', ''),
+        current_status=passenger_info.get('current_status', ''),
+        current_coach_id=passenger_info.get('current_coach_id', ''),
+        current_berth_no=passenger_info.get('current_berth_no', 0),
+        current_berth_code=passenger_info.get('current_berth_code', ''),
+    )
+
+
+# Columns compared and rewritten when a passenger's status changes
+PASSENGER_STATUS_FIELDS = [
+    'booking_status', 'booking_coach_id', 'booking_berth_no', 'booking_berth_code',
+    'current_status', 'current_coach_id', 'current_berth_no', 'current_berth_code',
+]
+
+
+def sync_passengers(passengers_by_status):
+    """
+    Bring stored passengers in line with fresh PNR data, writing only what changed
+    
+    Rows are matched on (pnr_status, passenger_serial_number). New passengers
+    are bulk-inserted, changed ones bulk-updated and vanished ones deleted;
+    an unchanged PNR costs a single SELECT. Call inside a transaction.
+    
+    Args:
+        passengers_by_status (dict): PNRStatus id -> list of passenger dicts
+        
+    Returns:
+        tuple: (created, updated, deleted) row counts
+    """
+    stored = {
+        (row.pnr_status_id, row.passenger_serial_number): row
+        for row in PassengerDetails.objects.filter(pnr_status_id__in=passengers_by_status)
+    }
+    fields = [PassengerDetails._meta.get_field(name) for name in PASSENGER_STATUS_FIELDS]
+    
+    incoming = {}
+    for pnr_status_id, passengers in passengers_by_status.items():
+        for passenger_info in passengers:
+            passenger = passenger_details(PNRStatus(id=pnr_status_id), passenger_info)
+            # Normalise API values ('33' vs 33) so unchanged rows compare equal
+            for field in fields:
+                setattr(passenger, field.attname, field.to_python(getattr(passenger, field.attname)))
+            incoming[(pnr_status_id, passenger.passenger_serial_number)] = passenger
+    
+    to_create, to_update = [], []
+    for key, passenger in incoming.items():
+        row = stored.get(key)
+        if row is None:
+            to_create.append(passenger)
+        elif any(getattr(row, field.attname) != getattr(passenger, field.attname) for field in fields):
+            for field in fields:
+                setattr(row, field.attname, getattr(passenger, field.attname))
+            to_update.append(row)
+    stale_ids = [row.id for key, row in stored.items() if key not in incoming]
+    
+    if stale_ids:
+        PassengerDetails.objects.filter(id__in=stale_ids).delete()
+    if to_create:
+        PassengerDetails.objects.bulk_create(to_create)
+    if to_update:
+        PassengerDetails.objects.bulk_update(to_update, PASSENGER_STATUS_FIELDS)
+    return len(to_create), len(to_update), len(stale_ids)
+
+
+def store_pnr_status(pnr_number, pnr_data):
+    """Persist API PNR data to PNRStatus/PassengerDetails and invalidate cached copies"""
+    # One transaction, so readers never see a PNR with its passengers half-written
+    with transaction.atomic():
+        pnr_status, created = PNRStatus.objects.update_or_create(
+            pnr_number=pnr_number,
+            defaults=pnr_status_fields(pnr_data),
+        )
+        sync_passengers({pnr_status.id: pnr_data.get('passengers', [])})
+    
+    pnr_cache.invalidate(pnr_number)
+    return pnr_status
+
+
+def store_pnr_statuses(pnr_items):
+    """
+    Persist a batch of (pnr_number, pnr_data) pairs in one transaction
+    
+    Upserts every PNRStatus row with one INSERT ... ON CONFLICT and syncs the
+    batch's passengers together, so a batch costs a fixed number of queries.
+    
+    Returns:
+        int: Number of PNRs stored
+    """
+    pnr_items = dict(pnr_items)
+    if not pnr_items:
+        return 0
+    
+    rows = [PNRStatus(pnr_number=pnr_number, **pnr_status_fields(pnr_data))
+            for pnr_number, pnr_data in pnr_items.items()]
+    update_fields = [*pnr_status_fields({}), 'last_updated']
+    with transaction.atomic():
+        PNRStatus.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['pnr_number'], update_fields=update_fields,
+        )
+        # Not every backend returns ids for upserted rows, so look them up
+        ids = dict(PNRStatus.objects.filter(pnr_number__in=pnr_items).values_list('pnr_number', 'id'))
+        sync_passengers({
+            ids[pnr_number]: pnr_data.get('passengers', []) for pnr_number, pnr_data in pnr_items.items()
+        })
+    
+    for pnr_number in pnr_items:
+        pnr_cache.invalidate(pnr_number)
+    return len(pnr_items)
+
+
 def get_station_name(station_code):
     """Get station name from code"""
+    return resolve_station_names([station_code]).get((station_code or '').strip().upper(), station_code)
+
+
+def resolve_station_codes(*stations):
+    """
+    Resolve free-text station inputs (codes or names) to exact station codes
+    
+    Uses a single StationCode query for all inputs. Returns one entry per
+    input: the matching code, or None when the input is blank or unknown.
+    """
+    cleaned = [(station or '').strip() for station in stations]
+    condition = Q()
+    for station in cleaned:
+        if station:
+            condition |= Q(station_code=station.upper()) | Q(station_name__iexact=station)
+    if not condition:
+        return [None] * len(cleaned)
+    
+    codes, names = set(), {}
+    for code, name in StationCode.objects.filter(condition).values_list('station_code', 'station_name'):
+        codes.add(code)
+        names[name.lower()] = code
+    
+    resolved = []
+    for station in cleaned:
+        if not station:
+            resolved.append(None)
+        elif station.upper() in codes:
+            resolved.append(station.upper())
+        else:
+            resolved.append(names.get(station.lower()))
+    return resolved
+
+
+def unique_station_code(text):
+    """Code of the only station the prefix index finds for ``text``, or None"""
+    if not text or not text.strip():
+        return None
+    matches = search_stations(text, limit=2)
+    return matches[0][0] if len(matches) == 1 else None
+
+
+def route_filter(source_code, destination_code, journey_date=None):
+    """Listings on a route: one route_key equality, or a range over its keys when no date is given"""
+    if journey_date:
+        return Q(route_key=route_key(source_code, destination_code, journey_date))
+    # Every "SRC|DST|<date>" sorts after "SRC|DST|" and before "SRC|DST}" ('}' follows '|')
+    prefix = f'{source_code.strip().upper()}|{destination_code.strip().upper()}|'
+    return Q(route_key__gt=prefix, route_key__lt=prefix[:-1] + '}')
+
+
+def station_filter(side, code, station):
+    """Exact-code filter for one end of the route; whole-name match when no code is known"""
+    if code:
+        return Q(**{f'{side}_station_code': code})
+    return Q(**{f'{side}_station__iexact': station}) | Q(**{f'{side}_station_code': (station or '').strip().upper()})
+
+
+def station_autocomplete(request):
+    """JSON station suggestions for a code or name prefix, served from the in-memory index"""
     try:
-        # First check local database
-        station = StationCode.objects.get(station_code=station_code)
-        return station.station_name
-    except StationCode.DoesNotExist:
-        # If not found locally, try API
-        try:
-            api_client = get_railway_api_client()
-            station_name = api_client.get_station_name(station_code)
-            
-            # Store in database for future use
-            if station_name != station_code:
-                StationCode.objects.create(
-                    station_code=station_code,
-                    station_name=station_name
-                )
-            
-            return station_name
-            
-        except Exception as e:
-            print(f"Error fetching station name: {e}")
-            return station_code
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 25)
+    except ValueError:
+        limit = 10
+    results = [
+        {'code': code, 'name': name, 'state': state}
+        for code, name, state in search_stations(request.GET.get('q', ''), limit)
+    ]
+    return JsonResponse({'results': results})
 
 
 def fetch_train_schedule(train_number):
-    """Fetch train schedule from API"""
-    try:
-        # Get API client and fetch train schedule
-        api_client = get_railway_api_client()
-        schedule_data = api_client.get_train_schedule(train_number)
-        
-        return schedule_data
-        
-    except Exception as e:
-        print(f"Error fetching train schedule: {e}")
-        return []
+    """Train schedule stops, from the local schedule store before the API"""
+    return get_train_schedule(train_number).stops
 
 
 # Admin views for ticket checkers
+@login_required
+def pnr_cache_stats(request):
+    """Hit/miss counters of this process's PNR cache, for staff"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'message': 'Admin privileges required.'}, status=403)
+    
+    return JsonResponse({'success': True, 'data': pnr_cache.stats()})
+
+
+@login_required
+def browse_cache_stats(request):
+    """Hit/miss counters per route of this process's browse cache, for staff"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'message': 'Admin privileges required.'}, status=403)
+    
+    return JsonResponse({'success': True, 'data': browse_cache.stats()})
+
+
 @login_required
 def admin_exchanges(request):
     """Admin view for ticket checkers"""
@@ -470,8 +1002,47 @@ def admin_exchanges(request):
         messages.error(request, 'Access denied. Admin privileges required.')
         return redirect('dashboard')
     
-    exchanges = SeatExchange.objects.filter(
-        payment_status='PAID'
-    ).order_by('-exchange_date')
+    exchanges = SeatExchange.objects.filter(payment_status='PAID')
+    
+    # Filters go through the (train_number, journey_date) prefix of seats_listing_class_idx
+    train_number = request.GET.get('train_number', '').strip()
+    journey_date = request.GET.get('journey_date', '').strip()
+    if train_number:
+        exchanges = exchanges.filter(seat_listing__train_number=train_number)
+    if journey_date:
+        try:
+            parsed_date = parse_date(journey_date)
+        except ValueError:
+            parsed_date = None
+        if parsed_date:
+            exchanges = exchanges.filter(seat_listing__journey_date=parsed_date)
+        else:
+            messages.error(request, 'Invalid journey date.')
+    
+    # Count and revenue come from one aggregate query instead of the template
+    start_of_today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    summary = exchanges.aggregate(
+        total_exchanges=Count('id'),
+        total_amount=Sum('exchange_amount'),
+        today_exchanges=Count('id', filter=Q(exchange_date__gte=start_of_today)),
+    )
+    
+    page_size = get_page_size(request, getattr(settings, 'SEATSWAP_ADMIN_PAGE_SIZE', 50))
+    page = keyset_paginate(
+        exchanges.select_related('seat_listing', 'seller', 'buyer'),
+        request.GET.get('cursor'),
+        page_size,
+        ordering=('-exchange_date', '-id'),
+    )
+    first_page_query, next_page_query = get_page_queries(request, page)
     
-    return render(request, 'seats/admin_exchanges.html', {'exchanges': exchanges})
+    context = {
+        'exchanges': page,
+        'summary': summary,
+        'train_number': train_number,
+        'journey_date': journey_date,
+        'next_page_query': next_page_query,
+        'first_page_query': first_page_query,
+        'is_first_page': not request.GET.get('cursor'),
+    }
+    return render(request, 'seats/admin_exchanges.html', context)